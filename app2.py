@@ -1,11 +1,14 @@
-from flask import Flask, request, render_template_string
-import difflib
-import json
+from flask import Flask, request, render_template_string, jsonify
 import os
+from inverted_store import InvertedStore
+from shared_index import SharedIndex
+from ranked_search import RankingCache, PAGE_SIZE, MAX_PAGE_SIZE
+from search_metrics import RequestTimer, StageMetrics
+import ranked_search
 
 app = Flask(__name__)
 
-# 예시 문서 데이터 (문서 ID와 내용)
+# 예시 문서 데이터 (문서 ID와 내용). 저장된 색인이 없을 때 처음 색인할 문서
 documents = {
     1: "Flask는 Python으로 작성된 마이크로 웹 프레임워크입니다.",
     2: "역색인은 정보 검색 시스템에서 자주 사용되는 기법입니다.",
@@ -13,48 +16,125 @@ documents = {
     4: "유사도 매칭은 사용자의 오타나 변형된 표현을 처리하는데 유용합니다.",
 }
 
-# 영구 저장을 위한 역색인 파일 경로
+# 영구 저장을 위한 역색인 파일 경로 (스냅샷, 변경 로그와 오타 교정 색인도 같은 폴더에 둔다)
 index_file = 'inverted_index.json'
 
-# 역색인 로드 또는 생성
-if os.path.exists(index_file):
-    with open(index_file, 'r', encoding='utf-8') as f:
-        # JSON은 리스트로 저장하므로, 값을 set으로 변환
-        inverted_index = {key: set(value) for key, value in json.load(f).items()}
+# 여러 워커로 띄울 때는 APP2_SHARED_INDEX 에 inverted_index.bin 경로를 주면 모든 워커가
+# 같은 파일을 mmap으로 읽기만 한다 (문서 추가/수정은 공유 색인 없이 띄운 프로세스 하나가 맡는다).
+#   APP2_SHARED_INDEX=inverted_index.bin gunicorn -w 16 app2:app
+shared_index_file = os.environ.get('APP2_SHARED_INDEX')
+
+if shared_index_file:
+    store = SharedIndex(shared_index_file)
 else:
-    inverted_index = {}
-    for doc_id, content in documents.items():
-        for word in content.split():
-            # 소문자로 변환하고 구두점 제거
-            word = word.lower().strip('.,!?')
-            if word in inverted_index:
-                inverted_index[word].add(doc_id)
-            else:
-                inverted_index[word] = {doc_id}
-    # JSON 파일에 저장하기 위해 set을 list로 변환
-    inverted_index_to_save = {key: list(value) for key, value in inverted_index.items()}
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(inverted_index_to_save, f, ensure_ascii=False, indent=2)
+    # 역색인 로드 또는 생성 (저장된 색인이 없으면 예시 문서로 만든다)
+    store = InvertedStore(index_file, documents)
+
+def batch_items(key):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get(key), list):
+        raise ValueError(f'JSON 본문에 {key} 목록이 필요합니다')
+    return body[key]
+
+# ---------------------
+# Bulk Ingest API
+# ---------------------
+#   POST   /api/documents  {"documents": [{"id"(선택), "text"}, ...]}  추가
+#   PUT    /api/documents  {"documents": [{"id", "text"}, ...]}        본문 수정
+#   DELETE /api/documents  {"ids": [id, ...]}                          삭제
+# 묶음 안에 잘못된 문서가 하나라도 있으면 아무것도 반영하지 않는다.
+@app.route('/api/documents', methods=['POST', 'PUT', 'DELETE'])
+def ingest():
+    if store.read_only:
+        return jsonify({'error': '공유 색인 모드에서는 문서를 고칠 수 없습니다'}), 405
+    try:
+        if request.method == 'POST':
+            ids = store.add(batch_items('documents'))
+        elif request.method == 'PUT':
+            ids = store.update(batch_items('documents'))
+        else:
+            ids = store.delete(batch_items('ids'))
+    except KeyError as e:
+        return jsonify({'error': '없는 문서입니다', 'ids': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'ids': ids, 'documents': len(store.documents), 'seq': store.seq})
+
+# ---------------------
+# Search API
+# ---------------------
+#   GET /api/search?q=검색어&limit=10&cursor=...
+#   {"query", "version", "total", "corrections": {오타: 대신 찾은 단어},
+#    "results": [{"id", "score", "snippet"}, ...], "next_cursor"}
+# 다음 페이지는 받은 next_cursor 를 그대로 cursor 로 넘긴다.
+ranking_cache = RankingCache()
+
+# 경로별 단계 시간 (search_metrics.py)
+metrics = {'page': StageMetrics(), 'api': StageMetrics()}
+
+@app.route('/api/search')
+def api_search():
+    timer = RequestTimer()
+    try:
+        limit = max(1, min(int(request.args.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit은 숫자여야 합니다'}), 400
+    try:
+        with store.view() as index:
+            result = ranked_search.search(index, request.args.get('q', ''), request.args.get('cursor'),
+                                          limit, ranking_cache, timer)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with timer.stage('render'):
+        response = jsonify(result)
+    metrics['api'].record(timer)
+    return response
+
+# ---------------------
+# Metrics
+# ---------------------
+#   GET    /api/metrics  {"page": {...}, "api": {...}, "cache", "index"}
+#                        경로마다 {"requests", "stages": {단계: {"count", "p50_ms", "p95_ms", "p99_ms",
+#                        "max_ms", "mean_ms", "total_s", "share"}}}
+#   DELETE /api/metrics  측정값을 비운다 (부하 테스트 시작 전에 부른다)
+@app.route('/api/metrics', methods=['GET', 'DELETE'])
+def api_metrics():
+    if request.method == 'DELETE':
+        for route in metrics.values():
+            route.reset()
+        ranking_cache.hits = ranking_cache.misses = 0
+    summary = {route: stage_metrics.summary() for route, stage_metrics in metrics.items()}
+    summary['cache'] = {'hits': ranking_cache.hits, 'misses': ranking_cache.misses}
+    summary['index'] = {'version': store.seq, 'documents': store.doc_count}
+    return jsonify(summary)
 
 @app.route('/', methods=['GET', 'POST'])
 def search():
+    timer = RequestTimer()
     results = {}
     query = ""
     if request.method == 'POST':
-        query = request.form.get('query', '').lower()
-        query_words = query.split()
+        with timer.stage('tokenize'):
+            query = request.form.get('query', '').lower()
+            query_words = query.split()
         doc_ids = set()
-        # 각 쿼리 단어에 대해 역색인 검색 및 유사 단어 추천
-        for q in query_words:
-            if q in inverted_index:
-                doc_ids.update(inverted_index[q])
-            else:
-                # 유사한 단어 찾기 (최대 1개, cutoff 조정 가능)
-                close = difflib.get_close_matches(q, inverted_index.keys(), n=1, cutoff=0.6)
-                if close:
-                    doc_ids.update(inverted_index[close[0]])
-        # 결과 문서 내용 가져오기
-        results = {doc_id: documents[doc_id] for doc_id in doc_ids}
+        with store.view() as index:
+            # 각 쿼리 단어에 대해 역색인 검색 및 유사 단어 추천
+            for q in query_words:
+                with timer.stage('lookup'):
+                    ids = index.postings(q)
+                if ids is None:
+                    # 유사한 단어 찾기 (편집 거리가 가장 가까운 단어 1개, 같으면 문서가 많은 단어)
+                    with timer.stage('fuzzy'):
+                        close = index.correct(q)
+                    if close is not None:
+                        with timer.stage('lookup'):
+                            ids = index.postings(close)
+                if ids:
+                    doc_ids.update(ids)
+            # 결과 문서 내용 가져오기
+            with timer.stage('lookup'):
+                results = {doc_id: index.document(doc_id) for doc_id in doc_ids}
 
     # 간단한 HTML 템플릿 (실제 서비스에서는 별도의 템플릿 파일 권장)
     html = """
@@ -82,7 +162,10 @@ def search():
     </body>
     </html>
     """
-    return render_template_string(html, results=results, query=query)
+    with timer.stage('render'):
+        page = render_template_string(html, results=results, query=query)
+    metrics['page'].record(timer)
+    return page
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,255 @@
+# app2_loadtest.py
+# 역색인 검색 앱(app2.py) 부하 테스트: 합성 문서를 넣고 검색어 종류를 섞어 목표 QPS로 요청을 보낸다
+#
+#   python app2_loadtest.py [--url http://127.0.0.1:5000] [--docs 5000 --words 40 --vocab 20000]
+#                           [--qps 50 --duration 20 --concurrency 16]
+#                           [--mix hit=5,miss=3,multi=2] [--endpoints api=1,page=1]
+#                           [--seed 0] [--out result.json]
+#
+# --url 이 없으면 임시 폴더에서 app2 를 별도 프로세스로 띄운다 (스레드 서버, 끝나면 지운다).
+# 문서는 POST /api/documents 로 넣으므로 --url 로 준 서버는 공유 색인 모드가 아니어야 한다
+# (이미 넣었으면 --docs 0, 같은 --seed 와 --vocab 이면 같은 단어 목록이 나온다).
+#
+#   hit   : 색인에 있는 단어 하나 (Zipf 분포로 흔한 단어가 자주 나온다)
+#   miss  : 단어 한 글자를 바꾼 오타 (오타 교정 색인을 탄다)
+#   multi : 단어 두세 개
+#
+# 요청은 정해진 시각에 보내고 (open loop) 지연 시간은 보내려던 시각부터 잰다. 서버가 밀리면
+# 기다린 시간까지 지연에 들어간다. 끝나면 서버의 GET /api/metrics (단계별 시간) 를 결과에 붙인다.
+# 결과 JSON 두 개는 doc_search_bench.py compare 로 비교할 수 있다.
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode, urlsplit
+from bench_common import make_vocabulary, zipf_weights, percentiles
+
+INGEST_BATCH = 500
+LOCAL_SERVER = ('import sys; sys.path.insert(0, sys.argv[1]); import app2; '
+                'app2.app.run(host="127.0.0.1", port=int(sys.argv[2]), threaded=True)')
+SERVER_START_TIMEOUT = 30
+KOREAN_RATIO = 0.8  # 합성 단어 중 한글 비율
+
+# ---------------------
+# Synthetic Data
+# ---------------------
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    replacement = chr(rng.randint(0xAC00, 0xD7A3)) if word[i] >= '가' else rng.choice('abcdefghijklmnopqrstuvwxyz')
+    return word[:i] + replacement + word[i + 1:]
+
+def make_queries(rng, vocabulary, cum_weights, mix, endpoints, count):
+    """[(종류, 경로, 검색어), ...] count 개."""
+    kinds, kind_weights = zip(*mix.items())
+    routes, route_weights = zip(*endpoints.items())
+    pick = lambda k: rng.choices(vocabulary, cum_weights=cum_weights, k=k)
+    queries = []
+    for _ in range(count):
+        kind = rng.choices(kinds, kind_weights)[0]
+        if kind == 'hit':
+            text = pick(1)[0]
+        elif kind == 'miss':
+            text = typo(rng, pick(1)[0])
+        else:
+            text = ' '.join(pick(rng.randint(2, 3)))
+        queries.append((kind, rng.choices(routes, route_weights)[0], text))
+    return queries
+
+def parse_weights(text, allowed):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in allowed:
+            raise ValueError(f'{name}: {", ".join(allowed)} 중 하나여야 합니다')
+        weights[name] = float(weight or 1)
+    return weights
+
+# ---------------------
+# HTTP
+# ---------------------
+class Client:
+    """스레드마다 하나씩 쓰는 HTTP 연결 (끊기면 다음 요청에서 다시 연다)."""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        try:
+            self.conn.request(method, path, body, headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            raise
+
+    def json(self, method, path, data=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8') if data is not None else None
+        status, payload = self.request(method, path, body, {'Content-Type': 'application/json'})
+        if status != 200:
+            raise RuntimeError(f'{method} {path}: HTTP {status} {payload[:200]!r}')
+        return json.loads(payload)
+
+    def search(self, route, text):
+        if route == 'api':
+            return self.request('GET', '/api/search?' + urlencode({'q': text}))[0]
+        body = urlencode({'query': text}).encode('utf-8')
+        return self.request('POST', '/', body, {'Content-Type': 'application/x-www-form-urlencoded'})[0]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_local_server(work):
+    port = free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, '-c', LOCAL_SERVER, here, str(port)], cwd=work,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            Client(url, timeout=1).json('GET', '/api/metrics')
+            return process, url
+        except (OSError, http.client.HTTPException, RuntimeError):
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError('app2 서버를 띄우지 못했습니다')
+            time.sleep(0.1)
+
+# ---------------------
+# Load Test
+# ---------------------
+def ingest(url, rng, vocabulary, cum_weights, docs, words):
+    client = Client(url)
+    start = time.perf_counter()
+    for first in range(0, docs, INGEST_BATCH):
+        batch = [{'text': ' '.join(rng.choices(vocabulary, cum_weights=cum_weights,
+                                               k=rng.randint(1, 2 * words)))}
+                 for _ in range(min(INGEST_BATCH, docs - first))]
+        client.json('POST', '/api/documents', {'documents': batch})
+    return time.perf_counter() - start
+
+def drive(url, queries, qps, concurrency):
+    """queries 를 1/qps 초 간격으로 보내고 [(종류, 경로, 지연 초, HTTP 상태), ...] 를 돌려준다."""
+    jobs = queue.Queue()
+    for i, query in enumerate(queries):
+        jobs.put((i / qps, *query))
+    samples = []
+    start = time.perf_counter() + 0.1
+
+    def worker():
+        client = Client(url)
+        while True:
+            try:
+                at, kind, route, text = jobs.get_nowait()
+            except queue.Empty:
+                return
+            delay = start + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                status = client.search(route, text)
+            except (OSError, http.client.HTTPException):
+                status = 0
+            samples.append((kind, route, time.perf_counter() - (start + at), status))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+def summarize(samples):
+    latencies = [latency for _, _, latency, _ in samples]
+    return percentiles(latencies) if latencies else {'count': 0}
+
+def run_load_test(url=None, docs=5000, words=40, vocab=20000, qps=50, duration=20, concurrency=16,
+                  mix=None, endpoints=None, seed=0):
+    mix = mix or {'hit': 5, 'miss': 3, 'multi': 2}
+    endpoints = endpoints or {'api': 1, 'page': 1}
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, vocab, KOREAN_RATIO)
+    cum_weights = zipf_weights(len(vocabulary))
+    result = {
+        'options': {'docs': docs, 'words': words, 'vocab': vocab, 'qps': qps, 'duration': duration,
+                    'concurrency': concurrency, 'mix': mix, 'endpoints': endpoints, 'seed': seed,
+                    'url': url or 'local'},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': os.cpu_count()},
+    }
+    work = process = None
+    try:
+        if url is None:
+            work = tempfile.mkdtemp(prefix='app2_load_')
+            process, url = start_local_server(work)
+        if docs:
+            seconds = ingest(url, rng, vocabulary, cum_weights, docs, words)
+            result['ingest'] = {'seconds': seconds, 'docs_per_s': docs / seconds}
+        client = Client(url)
+        client.request('DELETE', '/api/metrics')
+        queries = make_queries(rng, vocabulary, cum_weights, mix, endpoints, int(qps * duration))
+        samples, elapsed = drive(url, queries, qps, concurrency)
+        ok = [sample for sample in samples if sample[3] == 200]
+        result.update({
+            'requests': len(samples),
+            'errors': len(samples) - len(ok),
+            'elapsed_s': elapsed,
+            'throughput_qps': len(ok) / elapsed,
+            'latency': summarize(ok),
+            'by_kind': {kind: summarize([s for s in ok if s[0] == kind]) for kind in mix},
+            'by_endpoint': {route: summarize([s for s in ok if s[1] == route]) for route in endpoints},
+            'server': client.json('GET', '/api/metrics'),
+        })
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if work is not None:
+            shutil.rmtree(work, ignore_errors=True)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='역색인 검색 앱 부하 테스트')
+    parser.add_argument('--url', default=None, help='이미 떠 있는 app2 주소 (없으면 임시로 띄운다)')
+    parser.add_argument('--docs', type=int, default=5000, help='먼저 넣을 합성 문서 수 (0이면 넣지 않는다)')
+    parser.add_argument('--words', type=int, default=40, help='문서당 평균 단어 수')
+    parser.add_argument('--vocab', type=int, default=20000)
+    parser.add_argument('--qps', type=float, default=50, help='목표 초당 요청 수')
+    parser.add_argument('--duration', type=float, default=20, help='초')
+    parser.add_argument('--concurrency', type=int, default=16, help='동시에 보내는 최대 요청 수')
+    parser.add_argument('--mix', default='hit=5,miss=3,multi=2', help='검색어 종류 비율')
+    parser.add_argument('--endpoints', default='api=1,page=1', help='경로 비율 (api=/api/search, page=/)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='결과 JSON 파일 (없으면 화면에 출력)')
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_weights(args.mix, ('hit', 'miss', 'multi'))
+        endpoints = parse_weights(args.endpoints, ('api', 'page'))
+    except ValueError as e:
+        parser.error(str(e))
+
+    result = run_load_test(args.url, args.docs, args.words, args.vocab, args.qps, args.duration,
+                           args.concurrency, mix, endpoints, args.seed)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+# bench_common.py
+# 벤치마크 도구들이 같이 쓰는 합성 데이터와 지연 시간 통계
+#
+# doc_search_bench.py (문서 검색), app2_loadtest.py (역색인 검색 앱 부하 테스트),
+# search_metrics.py (app2 단계별 시간) 가 같은 방식으로 단어를 만들고 백분위수를 내도록 여기 둔다.
+import statistics
+from itertools import accumulate
+
+def make_vocabulary(rng, size, korean_ratio):
+    """한글 2~4글자 / 영문 3~9글자 단어 size 개. 순서가 빈도 순위다 (zipf_weights 와 같이 쓴다)."""
+    words = set()
+    while len(words) < size:
+        if rng.random() < korean_ratio:
+            word = ''.join(chr(rng.randint(0xAC00, 0xD7A3)) for _ in range(rng.randint(2, 4)))
+        else:
+            word = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+        words.add(word)
+    words = sorted(words)
+    rng.shuffle(words)  # 순서 = 빈도 순위
+    return words
+
+def zipf_weights(size, s=1.1):
+    """rng.choices(cum_weights=...) 에 넘길 Zipf 누적 가중치. 순위 r 의 가중치는 1 / r**s."""
+    return list(accumulate(1 / rank ** s for rank in range(1, size + 1)))
+
+def percentiles(samples):
+    """초 단위 표본들의 개수, 백분위수, 최대, 평균 (밀리초)."""
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {'count': len(samples), 'p50_ms': pick(0.5) * 1000, 'p90_ms': pick(0.9) * 1000,
+            'p95_ms': pick(0.95) * 1000, 'p99_ms': pick(0.99) * 1000, 'max_ms': samples[-1] * 1000,
+            'mean_ms': statistics.fmean(samples) * 1000}
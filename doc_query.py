@@ -0,0 +1,357 @@
+# doc_query.py
+# 문서 검색 앱의 질의 처리
+#
+#   사과 배         두 단어가 모두 있는 문서 (AND 생략 가능)
+#   사과 OR 배      둘 중 하나라도 있는 문서
+#   사과 NOT 배     사과가 있고 배는 없는 문서 (-배 도 같음)
+#   "사과 주스"     한 줄 안에 붙어서 나오는 구문
+#   (사과 OR 배) 주스
+#   색인*           색인으로 시작하는 단어
+#
+# 연산자는 대문자로만 인식한다. 결과는 문서 단위로 맞추고, 보여줄 줄은 맞은 단어가 나온 줄이다.
+# 한글 단어는 조사가 붙거나 합성어 안에 들어 있어도 찾도록 n-gram 색인으로 그 단어를 포함하는
+# 모든 단어까지 넓혀서 찾는다 ("색인" -> 색인, 색인을, 역색인 ...). 그 밖의 단어는 정확히 일치하는
+# 단어가 없을 때만 넓힌다.
+import math
+import heapq
+import threading
+from collections import OrderedDict
+import regex
+
+WORD_RE = regex.compile(r'\p{L}+')
+HANGUL_RE = regex.compile(r'\p{Hangul}')
+MAX_EXPANSIONS = 500  # 부분/접두어 검색으로 넓힐 최대 단어 수
+TOP_K = 1000  # 순위를 매겨 돌려줄 최대 문서 수
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 2.0  # 제목에 나온 단어는 본문 몇 줄만큼 쳐줄지
+CHECK_EVERY = 4096  # postings를 이만큼 읽을 때마다 취소 여부를 확인
+QUERY_TOKEN_RE = regex.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+
+class QueryCancelled(Exception):
+    pass
+
+def tokenize(text):
+    return [word.lower() for word in WORD_RE.findall(text)]
+
+# ---------------------
+# Query Parser
+# ---------------------
+# 노드: ('term', 단어) ('prefix', 단어) ('phrase', [단어...])
+#       ('and', [노드...]) ('or', [노드...]) ('not', 노드)
+def parse_query(text):
+    tokens = QUERY_TOKEN_RE.findall(text)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def parse_or():
+        nonlocal pos
+        children = [parse_and()]
+        while peek() == 'OR':
+            pos += 1
+            children.append(parse_and())
+        children = [c for c in children if c is not None]
+        if len(children) <= 1:
+            return children[0] if children else None
+        return ('or', children)
+
+    def parse_and():
+        nonlocal pos
+        children = []
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                pos += 1
+                continue
+            node = parse_unary()
+            if node is not None:
+                children.append(node)
+        if len(children) <= 1:
+            return children[0] if children else None
+        return ('and', children)
+
+    def parse_unary():
+        nonlocal pos
+        token = peek()
+        if token == 'NOT':
+            pos += 1
+            node = parse_unary() if peek() not in (None, ')', 'OR') else None
+            return ('not', node) if node is not None else None
+        if token.startswith('-') and len(token) > 1:
+            tokens[pos] = token[1:]
+            node = parse_unary()
+            return ('not', node) if node is not None else None
+        return parse_primary()
+
+    def parse_primary():
+        nonlocal pos
+        token = tokens[pos]
+        pos += 1
+        if token == '(':
+            node = parse_or()
+            if peek() == ')':
+                pos += 1
+            return node
+        if token == ')':
+            return None
+        if token.startswith('"'):
+            words = tokenize(token.strip('"'))
+            if len(words) > 1:
+                return ('phrase', words)
+            return ('term', words[0]) if words else None
+        words = tokenize(token)
+        if len(words) > 1:
+            return ('and', [('term', w) for w in words])
+        if not words:
+            return None
+        return ('prefix', words[0]) if token.endswith('*') else ('term', words[0])
+
+    node = None
+    while pos < len(tokens):
+        part = parse_or()
+        if part is not None:
+            node = part if node is None else ('and', [node, part])
+        if peek() == ')':
+            pos += 1
+    return node
+
+def scoring_terms(node):
+    """순위 계산에 쓸 단어 노드들 (NOT 아래는 뺀다). 구문의 단어는 정확히 일치만."""
+    if node is None:
+        return []
+    kind = node[0]
+    if kind in ('term', 'prefix'):
+        return [node]
+    if kind == 'phrase':
+        return [('exact', word) for word in node[1]]
+    if kind == 'not':
+        return []
+    return [term for child in node[1] for term in scoring_terms(child)]
+
+# ---------------------
+# Query Evaluation
+# ---------------------
+class QueryEngine:
+    """MappedIndex (또는 segments.SegmentedIndex) 위에서 질의를 평가한다.
+
+    AND는 postings가 가장 짧은 쪽부터 후보 문서를 만들고, 나머지 단어는 블록 skip pointer로
+    후보 문서가 있을 블록만 풀어서 확인한다. NOT도 같은 방식으로 후보에서 뺀다.
+    결과는 {doc_id: {줄 번호, ...}} 이며 제목 일치는 줄 번호 -1.
+    """
+
+    def __init__(self, index, line_text=None, cancelled=None):
+        self.index = index
+        self.line_text = line_text
+        self.cancelled = cancelled  # 새 검색어가 들어오면 True를 돌려주는 함수
+
+    def check(self):
+        if self.cancelled is not None and self.cancelled():
+            raise QueryCancelled()
+
+    def search(self, text):
+        """[(doc_id, 줄 번호), ...] 를 문서, 줄 순서로 돌려준다."""
+        matches = self.evaluate(parse_query(text))
+        return [(doc_id, line) for doc_id in sorted(matches) for line in sorted(matches[doc_id])]
+
+    def rank(self, text, k=TOP_K):
+        """BM25 점수 상위 k개 문서를 [(점수, doc_id, [줄 번호...]), ...] 로 돌려준다.
+
+        tf는 단어가 나온 줄 수 (제목은 TITLE_BOOST 줄로 친다). 전체를 정렬하지 않고 heap으로
+        상위 k개만 고른다.
+        """
+        node = parse_query(text)
+        matches = self.evaluate(node)
+        if not matches:
+            return []
+        n = max(self.index.doc_count, 1)
+        avg_length = self.index.avg_doc_length or 1.0
+        scores = dict.fromkeys(matches, 0.0)
+        for term in scoring_terms(node):
+            # 부분/접두어로 넓힌 단어들은 한 단어로 보고 tf, df를 합친다
+            tf = {}
+            docs = set()
+            for postings in self.expand(term):
+                self.check()
+                for doc_id, slot in postings:
+                    docs.add(doc_id)
+                    if doc_id in scores:
+                        tf[doc_id] = tf.get(doc_id, 0) + (TITLE_BOOST if slot == 0 else 1)
+            df = len(docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, freq in tf.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.index.doc_length(doc_id) / avg_length)
+                scores[doc_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, doc_id, sorted(matches[doc_id])) for doc_id, score in top]
+
+    def expand(self, node):
+        """term/prefix 노드에 해당하는 postings 목록 (단어마다 하나)."""
+        kind, word = node
+        if kind == 'exact':
+            words = [word]
+        elif kind == 'prefix':
+            words = self.index.prefix_words(word, MAX_EXPANSIONS)
+        else:
+            words = [word] if word in self.index else []
+            if HANGUL_RE.search(word) or not words:
+                words = sorted(set(words) | set(self.index.substring_words(word, MAX_EXPANSIONS)))
+        postings = (self.index.term_postings(w) for w in words)
+        return [p for p in postings if p is not None]
+
+    def evaluate(self, node):
+        if node is None:
+            return {}
+        kind = node[0]
+        if kind in ('term', 'prefix'):
+            result = {}
+            for postings in self.expand(node):
+                for doc_id, lines in self._materialize(postings).items():
+                    result.setdefault(doc_id, set()).update(lines)
+            return result
+        if kind == 'phrase':
+            return self._phrase(node[1])
+        if kind == 'and':
+            return self._and(node[1])
+        if kind == 'or':
+            result = {}
+            for child in node[1]:
+                for doc_id, lines in self.evaluate(child).items():
+                    result.setdefault(doc_id, set()).update(lines)
+            return result
+        # NOT 혼자서는 결과가 없다
+        return {}
+
+    def _materialize(self, postings):
+        result = {}
+        for n, (doc_id, slot) in enumerate(postings):
+            if n % CHECK_EVERY == 0:
+                self.check()
+            result.setdefault(doc_id, set()).add(slot - 1)
+        return result
+
+    def _operand(self, node):
+        """(크기 추정, TermPostings 또는 평가된 dict). 결과가 없으면 None."""
+        if node[0] in ('term', 'prefix'):
+            expanded = self.expand(node)
+            if len(expanded) == 1:
+                return expanded[0].count, expanded[0]
+        matches = self.evaluate(node)
+        return (len(matches), matches) if matches else None
+
+    def _and(self, children):
+        positives = [c for c in children if c[0] != 'not']
+        negatives = [c[1] for c in children if c[0] == 'not']
+        operands = []
+        for child in positives:
+            operand = self._operand(child)
+            if operand is None:
+                return {}
+            operands.append(operand)
+        if not operands:
+            return {}
+        operands.sort(key=lambda operand: operand[0])
+
+        first = operands[0][1]
+        result = first if isinstance(first, dict) else self._materialize(first)
+        for _, operand in operands[1:]:
+            if isinstance(operand, dict):
+                result = {doc_id: lines | operand[doc_id]
+                          for doc_id, lines in result.items() if doc_id in operand}
+            else:
+                self.check()
+                narrowed = {}
+                for doc_id in sorted(result):
+                    slots = operand.slots_of(doc_id)
+                    if slots:
+                        narrowed[doc_id] = result[doc_id] | {slot - 1 for slot in slots}
+                result = narrowed
+            if not result:
+                return {}
+
+        for child in negatives:
+            if child[0] in ('term', 'prefix'):
+                for postings in self.expand(child):
+                    result = {doc_id: lines for doc_id, lines in sorted(result.items())
+                              if not postings.slots_of(doc_id)}
+            else:
+                excluded = self.evaluate(child)
+                result = {doc_id: lines for doc_id, lines in result.items() if doc_id not in excluded}
+        return result
+
+    def _phrase(self, words):
+        # 모든 단어가 같은 줄에 있는 (문서, 줄) 을 postings로 좁힌 다음 줄 내용으로 확인
+        postings = []
+        for word in set(words):
+            term = self.index.term_postings(word)
+            if term is None:
+                return {}
+            postings.append(term)
+        postings.sort(key=len)
+
+        result = self._materialize(postings[0])
+        for term in postings[1:]:
+            narrowed = {}
+            for doc_id in sorted(result):
+                lines = result[doc_id] & {slot - 1 for slot in term.slots_of(doc_id)}
+                if lines:
+                    narrowed[doc_id] = lines
+            result = narrowed
+            if not result:
+                return {}
+
+        verified = {}
+        for doc_id, lines in result.items():
+            lines = {line for line in lines if self._contains_phrase(doc_id, line, words)}
+            if lines:
+                verified[doc_id] = lines
+        return verified
+
+    def _contains_phrase(self, doc_id, line, words):
+        if line == -1:
+            text = self.index.doc_path(doc_id).stem
+        elif self.line_text is not None:
+            text = self.line_text(doc_id, line)
+        else:
+            return True
+        tokens = tokenize(text)
+        n = len(words)
+        return any(tokens[i:i + n] == words for i in range(len(tokens) - n + 1))
+
+# ---------------------
+# Query Result Cache
+# ---------------------
+class QueryCache:
+    """최근 검색 결과 LRU. 색인이 바뀌면 clear() 한다.
+
+    검색 스레드들이 put 하고 GUI 스레드가 get 하므로 lock을 잡고 고친다.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        return ' '.join(text.split())
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            results = self._items.get(key)
+            if results is not None:
+                self._items.move_to_end(key)
+            return results
+
+    def put(self, text, results):
+        key = self.key(text)
+        with self._lock:
+            self._items[key] = results
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,294 @@
+# doc_search_bench.py
+# 문서 검색 앱 벤치마크: 재현 가능한 합성 Office 문서 묶음을 만들고 색인/검색 성능을 JSON으로 남긴다
+#
+#   python doc_search_bench.py corpus 폴더 [--files 400 --lines 60 --vocab 20000 --korean 0.7 --seed 0]
+#   python doc_search_bench.py run 폴더 [--out result.json]
+#   python doc_search_bench.py compare 이전.json 이번.json
+#
+# corpus 는 같은 옵션이면 항상 같은 파일을 만든다 (단어 빈도는 Zipf 분포, 흔한 단어와 드문 단어가 섞임).
+# run 은 빈 작업 폴더에서 색인부터 하므로 최대 메모리는 새 프로세스로 돌려야 의미가 있다.
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import statistics
+import multiprocessing
+from pathlib import Path
+import docx, pptx, openpyxl
+from doc_query import QueryEngine
+from bench_common import make_vocabulary, zipf_weights, percentiles
+from doc_search_core import DocSearch, Indexer, SEGMENT_DIR, MANIFEST_FILE
+
+try:
+    import resource  # Windows에는 없다
+except ImportError:
+    resource = None
+
+CORPUS_FILE = 'corpus.json'  # 문서 묶음을 만든 옵션과 단어 목록 (빈도 순)
+KINDS = ('docx', 'pptx', 'xlsx', 'pdf')
+PARTICLES = ('을', '를', '은', '는', '이', '가', '에서', '으로', '의')
+FILES_PER_FOLDER = 50
+PDF_LINES_PER_PAGE = 40
+PPTX_LINES_PER_SLIDE = 12
+QUERY_SAMPLES = 50  # 질의 종류마다 잴 횟수
+LOAD_REPEAT = 5
+
+# ---------------------
+# Corpus Generator
+# ---------------------
+def make_lines(rng, vocabulary, cum_weights, lines, words_per_line):
+    out = []
+    for _ in range(lines):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 2 * words_per_line))
+        # 한글 단어 일부에는 조사를 붙여 부분 문자열 검색도 쓰이게 한다
+        out.append(' '.join(w + rng.choice(PARTICLES) if w[0] >= '가' and rng.random() < 0.3 else w
+                            for w in words))
+    return out
+
+def write_docx(path, lines):
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    document.save(path)
+
+def write_pptx(path, lines):
+    prs = pptx.Presentation()
+    for i in range(0, len(lines), PPTX_LINES_PER_SLIDE):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        box = slide.shapes.add_textbox(0, 0, prs.slide_width, prs.slide_height)
+        box.text_frame.text = '\n'.join(lines[i:i + PPTX_LINES_PER_SLIDE])
+    prs.save(path)
+
+def write_xlsx(path, lines):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    for line in lines:
+        sheet.append(line.split())
+    wb.save(path)
+
+def write_pdf(path, lines):
+    # 글꼴은 넣지 않고 ToUnicode 표만 두는 최소 PDF (한글/영문 추출용, 화면에는 제대로 안 보인다)
+    cmap = ('/CIDInit /ProcSet findresource begin 12 dict begin begincmap /CMapName /Uni def '
+            '/CMapType 2 def 1 begincodespacerange <0000> <FFFF> endcodespacerange '
+            '2 beginbfrange <0020> <007E> <0020> <AC00> <D7A3> <AC00> endbfrange '
+            'endcmap CMapName currentdict /CMap defineresource pop end end')
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+    font = 3 + 2 * len(pages)
+    objs = ['<< /Type /Catalog /Pages 2 0 R >>',
+            '<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                ' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages))), len(pages))]
+    for i, page in enumerate(pages):
+        objs.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R '
+                    f'/Resources << /Font << /F1 {font} 0 R >> >> >>')
+        body = 'BT /F1 10 Tf 40 760 Td 12 TL ' + ' '.join(
+            f"<{line.encode('utf-16-be').hex()}> Tj T*" for line in page) + ' ET'
+        objs.append(f'<< /Length {len(body)} >>\nstream\n{body}\nendstream')
+    objs.append(f'<< /Type /Font /Subtype /Type0 /BaseFont /Bench /Encoding /Identity-H '
+                f'/DescendantFonts [{font + 1} 0 R] /ToUnicode {font + 2} 0 R >>')
+    objs.append('<< /Type /Font /Subtype /CIDFontType2 /BaseFont /Bench '
+                '/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> >>')
+    objs.append(f'<< /Length {len(cmap)} >>\nstream\n{cmap}\nendstream')
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for i, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f'{i} 0 obj\n{obj}\nendobj\n'.encode('ascii')
+    xref = len(out)
+    out += f'xref\n0 {len(objs) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    out += b''.join(f'{offset:010d} 00000 n \n'.encode('ascii') for offset in offsets)
+    out += f'trailer << /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+WRITERS = {'docx': write_docx, 'pptx': write_pptx, 'xlsx': write_xlsx, 'pdf': write_pdf}
+
+def generate_corpus(folder, files=400, lines=60, words_per_line=10, vocab=20000, korean=0.7,
+                    zipf=1.1, kinds=KINDS, seed=0):
+    """folder 아래에 합성 문서를 만들고 corpus.json 에 옵션과 단어 목록을 남긴다."""
+    options = {'files': files, 'lines': lines, 'words_per_line': words_per_line, 'vocab': vocab,
+               'korean': korean, 'zipf': zipf, 'kinds': list(kinds), 'seed': seed}
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, vocab, korean)
+    cum_weights = zipf_weights(vocab, zipf)
+
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    size = 0
+    for i in range(files):
+        kind = kinds[i % len(kinds)]
+        # 파일마다 줄 수를 흔들어서 작은 파일과 큰 파일이 섞이게 한다
+        count = max(1, int(lines * rng.lognormvariate(0, 0.75)))
+        sub = folder / f'part{i // FILES_PER_FOLDER:03d}'
+        sub.mkdir(exist_ok=True)
+        path = sub / f'doc{i:05d}.{kind}'
+        WRITERS[kind](path, make_lines(rng, vocabulary, cum_weights, count, words_per_line))
+        size += path.stat().st_size
+    with open(folder / CORPUS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'options': options, 'bytes': size, 'vocabulary': vocabulary}, f, ensure_ascii=False)
+    return size
+
+# ---------------------
+# Measurements
+# ---------------------
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    usage = resource.getrusage(who).ru_maxrss
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+def disk_size(*paths):
+    size = 0
+    for path in paths:
+        path = Path(path)
+        if path.is_file():
+            size += path.stat().st_size
+        elif path.is_dir():
+            size += sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+    return size
+
+def pick_queries(index, vocabulary, rng, samples):
+    """질의 종류별 검색어 목록. 흔한/드문 단어는 색인의 문서 수(df)로 가른다."""
+    df = {}
+    for word in vocabulary[:200] + vocabulary[-2000:]:
+        postings = index.term_postings(word)
+        if postings is not None:
+            df[word] = len({doc_id for doc_id, _ in postings})
+    by_df = sorted(df, key=df.get)
+    rare = [w for w in by_df if df[w] <= 2] or by_df[:20]
+    common = by_df[-20:]
+    korean = [w for w in common if w[0] >= '가'] or common
+    return {
+        'single_common': [rng.choice(common) for _ in range(samples)],
+        'single_rare': [rng.choice(rare) for _ in range(samples)],
+        'multi_term': [' '.join(rng.sample(common, 2) + [rng.choice(by_df)]) for _ in range(samples)],
+        'korean_substring': [rng.choice(korean)[:2] for _ in range(samples)],
+        'phrase': [f'"{rng.choice(common)} {rng.choice(common)}"' for _ in range(samples)],
+    }
+
+def run_benchmark(corpus, processes=None, samples=QUERY_SAMPLES, seed=0):
+    corpus = Path(corpus).resolve()
+    with open(corpus / CORPUS_FILE, encoding='utf-8') as f:
+        info = json.load(f)
+    result = {
+        'corpus': dict(info['options'], bytes=info['bytes']),
+        'system': {'python': platform.python_version(), 'platform': platform.platform(),
+                   'cpus': os.cpu_count(), 'processes': processes or os.cpu_count()},
+    }
+    work = tempfile.mkdtemp(prefix='doc_search_bench_')
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        started = time.perf_counter()
+        indexer = Indexer(state=None, manifest=None, folder=corpus, processes=processes)
+        state, manifest, count, _ = indexer.run()
+        store = DocSearch()
+        store.indexed_folder = corpus
+        store.apply_index(state, manifest)
+        elapsed = time.perf_counter() - started
+        result['index'] = {
+            'files': count, 'seconds': elapsed, 'files_per_sec': count / elapsed,
+            'mb_per_sec': info['bytes'] / (1024 * 1024) / elapsed,
+            'segments': len(store.state['segments']),
+            'index_bytes': disk_size(SEGMENT_DIR, MANIFEST_FILE),
+            'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            'peak_worker_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            'extract': indexer.profile.types,
+            'failures': indexer.profile.failure_count,
+        }
+        store.close()
+
+        loads = []
+        for _ in range(LOAD_REPEAT):
+            store = DocSearch()
+            t = time.perf_counter()
+            store.load()
+            loads.append(time.perf_counter() - t)
+            store.close()
+        result['load'] = {'median_ms': statistics.median(loads) * 1000, 'max_ms': max(loads) * 1000}
+
+        store = DocSearch()
+        store.load()
+        queries = pick_queries(store.index, info['vocabulary'], random.Random(seed), samples)
+        result['queries'] = {}
+        for kind, texts in queries.items():
+            # 결과 캐시를 거치지 않도록 엔진을 직접 부른다
+            engine = QueryEngine(store.index, store.line_text)
+            times, hits = [], 0
+            for text in texts:
+                t = time.perf_counter()
+                hits += len(engine.rank(text))
+                times.append(time.perf_counter() - t)
+            result['queries'][kind] = dict(percentiles(times), mean_hits=hits / len(texts),
+                                           example=texts[0])
+        store.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+def compare(old, new, prefix=''):
+    # 숫자 항목마다 이전 -> 이번 과 변화율
+    for key, value in new.items():
+        before = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict):
+            compare(before or {}, value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)) and isinstance(before, (int, float)) and not isinstance(value, bool):
+            change = f'{(value - before) / before * 100:+.1f}%' if before else ''
+            print(f'{prefix}{key}: {before:.4g} -> {value:.4g} {change}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='문서 검색 벤치마크')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('corpus', help='합성 문서 묶음 만들기')
+    p.add_argument('folder')
+    p.add_argument('--files', type=int, default=400)
+    p.add_argument('--lines', type=int, default=60, help='파일당 평균 줄 수')
+    p.add_argument('--words', type=int, default=10, help='줄당 평균 단어 수')
+    p.add_argument('--vocab', type=int, default=20000)
+    p.add_argument('--korean', type=float, default=0.7, help='한글 단어 비율')
+    p.add_argument('--zipf', type=float, default=1.1)
+    p.add_argument('--kinds', default=','.join(KINDS))
+    p.add_argument('--seed', type=int, default=0)
+
+    p = commands.add_parser('run', help='색인/불러오기/검색 측정')
+    p.add_argument('folder')
+    p.add_argument('--out', default=None, help='결과 JSON 파일 (없으면 화면에 출력)')
+    p.add_argument('--processes', type=int, default=None)
+    p.add_argument('--samples', type=int, default=QUERY_SAMPLES)
+    p.add_argument('--seed', type=int, default=0)
+
+    p = commands.add_parser('compare', help='결과 JSON 두 개 비교')
+    p.add_argument('old')
+    p.add_argument('new')
+
+    args = parser.parse_args(argv)
+    if args.command == 'corpus':
+        if os.path.exists(os.path.join(args.folder, CORPUS_FILE)):
+            print(f'{args.folder} 에 이미 문서 묶음이 있습니다', file=sys.stderr)
+            return 1
+        t = time.perf_counter()
+        size = generate_corpus(args.folder, args.files, args.lines, args.words, args.vocab, args.korean,
+                               args.zipf, tuple(args.kinds.split(',')), args.seed)
+        print(f'{args.files}개 파일, {size / (1024 * 1024):.1f} MB ({time.perf_counter() - t:.1f}초)')
+    elif args.command == 'run':
+        result = run_benchmark(args.folder, args.processes, args.samples, args.seed)
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            print(text)
+    else:
+        with open(args.old, encoding='utf-8') as f_old, open(args.new, encoding='utf-8') as f_new:
+            compare(json.load(f_old), json.load(f_new))
+    return 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
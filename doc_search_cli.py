@@ -0,0 +1,113 @@
+# doc_search_cli.py
+# 문서 검색 앱의 명령줄 도구 (PyQt5 없이 돈다)
+#
+#   python doc_search_cli.py index 폴더        폴더를 색인 (데몬이 떠 있으면 데몬에 맡긴다)
+#   python doc_search_cli.py search 검색어     검색 결과를 한 줄씩 출력
+#   python doc_search_cli.py merge             작은 세그먼트를 모두 합친다
+#   python doc_search_cli.py serve             검색 데몬을 띄운다
+#
+# -d 로 색인 파일이 있는 폴더를 정한다 (기본은 현재 폴더, GUI와 같은 곳).
+import os
+import sys
+import argparse
+import multiprocessing
+from pathlib import Path
+from doc_search_core import DocSearch, Indexer, EXTRACT_REPORT_FILE
+from doc_search_daemon import DaemonClient, DAEMON_HOST, DAEMON_PORT, DAEMON_URL, RESULT_LIMIT, serve
+
+def print_progress(checked, extracted, rate):
+    print(f"\r확인 {checked}개, 새로 추출 {extracted}개 (초당 {rate:.1f}개)", end='', file=sys.stderr)
+
+def cmd_index(args):
+    client = None if args.local else DaemonClient.connect(args.url)
+    if client is not None:
+        started = client.index(args.folder)
+        print("데몬에서 색인을 시작했습니다." if started else "데몬이 이미 색인 중입니다.")
+        return 0 if started else 1
+    store = DocSearch()
+    store.load()
+    folder = args.folder
+    indexer = Indexer(state=store.state, manifest=store.manifest, folder=folder,
+                      processes=args.processes, progress=print_progress)
+    state, manifest, count, changed = indexer.run()
+    print(file=sys.stderr)
+    indexer.profile.write(EXTRACT_REPORT_FILE)
+    if args.report:
+        print(indexer.profile.report(), file=sys.stderr)
+    store.indexed_folder = folder
+    store.apply_index(state, manifest)
+    store.merge_all()
+    store.close()
+    print(f"색인 완료 및 저장: {count}개 파일 (새로 추출 {changed}개, 같은 내용 {indexer.profile.duplicates}개, "
+          f"실패 {indexer.profile.failure_count}개)")
+    print(f"느린/실패 파일 보고서: {os.path.abspath(EXTRACT_REPORT_FILE)}")
+    return 0
+
+def cmd_search(args):
+    client = None if args.local else DaemonClient.connect(args.url)
+    if client is not None:
+        rows = [result['text'] for result in client.search(args.query, args.k)]
+    else:
+        store = DocSearch()
+        store.load()
+        rows = [store.describe(result)[0] for result in store.search(args.query)[:args.k]]
+        store.close()
+    for row in rows:
+        print(row)
+    if not rows:
+        print("결과 없음")
+    return 0
+
+def cmd_merge(args):
+    store = DocSearch()
+    if store.load():
+        store.merge_all()
+        print(f"세그먼트 {len(store.state['segments'])}개")
+        store.close()
+    return 0
+
+def cmd_serve(args):
+    print(f"검색 데몬: http://{args.host}:{args.port}", file=sys.stderr)
+    serve(args.host, args.port)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='문서 검색 명령줄 도구')
+    parser.add_argument('-d', '--data', default='.', help='색인 파일이 있는 폴더')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('index', help='폴더 색인')
+    p.add_argument('folder')
+    p.add_argument('--processes', type=int, default=None)
+    p.add_argument('--url', default=DAEMON_URL)
+    p.add_argument('--local', action='store_true', help='데몬이 떠 있어도 직접 색인')
+    p.add_argument('--report', action='store_true', help='추출 보고서를 화면에도 출력')
+    p.set_defaults(func=cmd_index)
+
+    p = commands.add_parser('search', help='검색')
+    p.add_argument('query')
+    p.add_argument('-k', type=int, default=RESULT_LIMIT)
+    p.add_argument('--url', default=DAEMON_URL)
+    p.add_argument('--local', action='store_true', help='데몬을 거치지 않고 직접 검색')
+    p.set_defaults(func=cmd_search)
+
+    p = commands.add_parser('merge', help='세그먼트 병합')
+    p.set_defaults(func=cmd_merge)
+
+    p = commands.add_parser('serve', help='검색 데몬 실행')
+    p.add_argument('--host', default=DAEMON_HOST)
+    p.add_argument('--port', type=int, default=DAEMON_PORT)
+    p.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    if args.command == 'index':
+        # -d 로 옮기기 전에 현재 폴더 기준으로 푼다. 없는 폴더를 색인하면 색인이 모두 지워진다.
+        args.folder = Path(args.folder).resolve()
+        if not args.folder.is_dir():
+            parser.error(f'색인할 폴더가 없습니다: {args.folder}')
+    os.chdir(args.data)
+    return args.func(args)
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
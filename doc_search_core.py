@@ -0,0 +1,753 @@
+# doc_search_core.py
+# 문서 검색 앱의 색인/검색 핵심 (PyQt5 없이 쓸 수 있는 부분)
+#
+# GUI (main.py), 명령줄 도구 (doc_search_cli.py), 검색 데몬 (doc_search_daemon.py) 이 같이 쓴다.
+# 색인 파일은 모두 현재 폴더에 둔다.
+import os
+import pickle
+import hashlib
+import heapq
+import time
+import queue
+import fnmatch
+import threading
+import multiprocessing
+import multiprocessing.connection
+from pathlib import Path
+import docx, pptx, openpyxl
+import PyPDF2
+from index_format import convert_pickle_index
+from segments import (
+    SegmentWriter, SegmentedIndex, empty_state, load_state, save_state, commit_segments,
+    plan_merge, merge_segments, remove_unused, adopt_index)
+from doc_query import QueryEngine, QueryCache, tokenize
+
+SEGMENT_DIR = 'doc_segments'  # 세그먼트 색인 파일들과 segments.pkl
+INDEX_FILE = 'doc_index.bin'  # 세그먼트 이전의 단일 색인 (불러올 때 첫 세그먼트로 옮긴다)
+LEGACY_INDEX_FILE = 'doc_index.pkl'
+LEGACY_LINE_MAP_FILE = 'line_map.pkl'
+LINE_STORE_FILE = 'doc_lines.dat'
+MANIFEST_FILE = 'doc_manifest.pkl'
+FOLDER_FILE = 'doc_folder.txt'  # 색인한 폴더 (변경 감시용)
+HASH_CONTENT = False  # True면 mtime/size가 바뀌어도 내용이 같으면 재추출하지 않음
+NGRAM_INDEX = True  # 한글 부분 문자열 검색용 글자 n-gram 색인을 같이 만든다
+EXTRACT_TIMEOUT = 120  # 파일 하나당 최대 추출 시간(초)
+QUERY_CACHE_SIZE = 64
+INCLUDE_PATTERNS = ('*.pptx', '*.docx', '*.xlsx', '*.pdf')
+EXCLUDE_PATTERNS = ()  # 예: ('*/backup/*', '*_old.xlsx') — 전체 경로에 대해 비교
+WALK_QUEUE_SIZE = 1000  # 폴더 탐색이 추출보다 이만큼 앞서 나가면 기다린다
+PDF_MAX_BYTES = 200 * 1024 * 1024  # 이보다 큰 PDF는 제목만 색인
+PDF_MAX_PAGES = 2000
+PDF_TIME_BUDGET = 60  # PDF 본문 추출에 쓸 최대 시간(초), 넘으면 거기까지만 색인
+XLSX_MAX_SHEET_CELLS = 500_000  # 시트 하나에서 읽을 최대 셀 수, 넘으면 다음 시트로
+XLSX_MAX_CELLS = 2_000_000  # 파일 하나에서 읽을 최대 셀 수
+EXTRACT_REPORT_FILE = 'doc_extract_report.txt'  # 마지막 색인의 느린/실패 파일 보고서
+SLOW_FILES = 20  # 보고서에 남길 가장 느린 파일 수
+MAX_FAILURES = 1000  # 보고서에 이름을 남길 실패 파일 수 (넘으면 개수만 센다)
+
+# ---------------------
+# Text Extraction Logic
+# ---------------------
+def extract_text(path):
+    # 읽지 못하면 예외를 그대로 올린다 (extract_file 이 실패 이유로 남긴다)
+    suffix = Path(path).suffix.lower()
+    if suffix == '.docx':
+        doc = docx.Document(path)
+        return '\n'.join(p.text for p in doc.paragraphs)
+
+    elif suffix == '.pptx':
+        prs = pptx.Presentation(path)
+        text = []
+        for slide in prs.slides:
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    text.append(shape.text)
+        return '\n'.join(text)
+
+    elif suffix == '.xlsx':
+        return '\n'.join(extract_xlsx(path))
+
+    else:
+        return ''
+
+def extract_xlsx(path, stats=None):
+    """시트를 read_only 모드로 한 행씩 읽어 행마다 한 줄을 내놓는다.
+
+    셀 객체를 통째로 만들지 않으므로 통합 문서 크기와 상관없이 메모리가 일정하다.
+    시트마다 XLSX_MAX_SHEET_CELLS, 파일 전체 XLSX_MAX_CELLS 개 셀까지만 읽고,
+    stats 를 주면 잘린 이유를 'truncated' 에 적는다.
+    """
+    stats = {} if stats is None else stats
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        cells = 0
+        for sheet in wb.worksheets:
+            # 파일에 적힌 사용 범위가 틀린 경우가 많아 행을 끝까지 읽게 한다 (빈 셀로 채우지도 않는다)
+            sheet.reset_dimensions()
+            sheet_cells = 0
+            for row in sheet.iter_rows(values_only=True):
+                yield ' '.join(str(cell) for cell in row if cell)
+                sheet_cells += len(row)
+                cells += len(row)
+                if cells >= XLSX_MAX_CELLS:
+                    stats['truncated'] = f'셀 {XLSX_MAX_CELLS}개 초과 ({sheet.title} 시트에서 멈춤)'
+                    return
+                if sheet_cells >= XLSX_MAX_SHEET_CELLS:
+                    stats['truncated'] = f'{sheet.title} 시트 셀 {XLSX_MAX_SHEET_CELLS}개 초과'
+                    break
+    finally:
+        wb.close()
+
+def extract_pdf(path, stats=None):
+    """PDF를 한 페이지씩 읽어 (줄 목록, 페이지마다 첫 줄 번호) 를 돌려준다.
+
+    PdfReader는 파일에서 필요한 객체만 읽으므로 큰 PDF도 통째로 메모리에 올리지 않는다.
+    크기/페이지 수/시간 예산을 넘으면 그때까지 읽은 페이지만 색인한다.
+    stats 를 주면 잘린 이유 ('truncated') 와 오류 ('error') 를 적는다.
+    """
+    stats = {} if stats is None else stats
+    lines, pages = [], []
+    try:
+        if os.path.getsize(path) > PDF_MAX_BYTES:
+            stats['truncated'] = f'{PDF_MAX_BYTES // (1024 * 1024)} MB 초과'
+            return lines, pages
+        deadline = time.monotonic() + PDF_TIME_BUDGET
+        with open(path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            for page_num, page in enumerate(reader.pages):
+                if page_num >= PDF_MAX_PAGES:
+                    stats['truncated'] = f'{PDF_MAX_PAGES}쪽 초과'
+                    break
+                if time.monotonic() > deadline:
+                    stats['truncated'] = f'{PDF_TIME_BUDGET}초 초과 ({page_num}쪽까지)'
+                    break
+                pages.append(len(lines))
+                lines.extend((page.extract_text() or '').split('\n'))
+    except Exception as e:
+        stats['error'] = f'{type(e).__name__}: {e}'
+    return lines, pages
+
+def new_stats(size=0):
+    return {'bytes': size, 'parse_seconds': 0.0, 'tokenize_seconds': 0.0, 'lines': 0, 'tokens': 0,
+            'error': None, 'truncated': None}
+
+def extract_file(path):
+    """워커 프로세스에서 실행: 본문 추출 + 줄 단위 토큰화.
+
+    (lines, line_words, pages, stats) 를 돌려준다. stats 는 크기, 단계별 시간, 줄/단어 수,
+    실패 이유. 읽지 못한 파일도 예외 대신 빈 본문과 stats['error'] 로 돌려준다.
+    """
+    stats = new_stats()
+    lines, line_words, pages = [], [], []
+    tokenize_seconds = 0.0
+    started = time.perf_counter()
+    try:
+        stats['bytes'] = os.path.getsize(path)
+        suffix = Path(path).suffix.lower()
+        if suffix == '.pdf':
+            lines, pages = extract_pdf(path, stats)
+        elif suffix == '.xlsx':
+            # 행 목록을 먼저 다 만들지 않고 읽는 대로 토큰화한다
+            for line in extract_xlsx(path, stats):
+                tokenized = time.perf_counter()
+                line_words.append(tokenize(line))
+                tokenize_seconds += time.perf_counter() - tokenized
+                lines.append(line)
+        else:
+            lines = extract_text(path).split('\n')
+    except Exception as e:
+        stats['error'] = f'{type(e).__name__}: {e}'
+    parsed = time.perf_counter()
+    line_words.extend(tokenize(line) for line in lines[len(line_words):])
+    stats['parse_seconds'] = parsed - started - tokenize_seconds
+    stats['tokenize_seconds'] = time.perf_counter() - parsed + tokenize_seconds
+    stats['lines'] = len(lines)
+    stats['tokens'] = sum(len(words) for words in line_words)
+    return lines, line_words, pages, stats
+
+def failed_result(path, seconds, error):
+    # 워커가 시간 초과로 죽었거나 결과 없이 끝난 파일
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    stats = new_stats(size)
+    stats['parse_seconds'] = seconds
+    stats['error'] = error
+    return [], [], [], stats
+
+# ---------------------
+# Extraction Process Pool
+# ---------------------
+IDLE = object()  # 작업 목록이 아직 다음 파일을 못 준비했을 때 흘려보내는 값
+
+def _extract_loop(conn):
+    # 워커마다 파이프 하나로 경로를 받고 결과를 돌려준다. 시간 초과로 죽여도 그 파이프만 버리면 된다.
+    for path in iter(conn.recv, None):
+        try:
+            result = extract_file(path)
+        except Exception as e:
+            result = failed_result(path, 0.0, f'{type(e).__name__}: {e}')
+        conn.send((path, result))
+
+class ExtractionPool:
+    """파일 단위로 작업을 나눠주는 프로세스 풀.
+
+    워커마다 한 번에 한 파일만 맡기므로 어떤 파일이 얼마나 걸리는지 알 수 있고,
+    timeout을 넘긴 워커는 강제 종료 후 새로 띄운다. 결과를 보내던 중에 죽여도 다른 워커의
+    결과가 깨지지 않도록 공유 큐 대신 워커마다 따로 파이프를 쓴다.
+    """
+
+    def __init__(self, processes=None, timeout=EXTRACT_TIMEOUT):
+        self.processes = processes or os.cpu_count() or 1
+        self.timeout = timeout
+        self.workers = {}
+        self._next_id = 0
+
+    def __enter__(self):
+        for _ in range(self.processes):
+            self._spawn()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spawn(self):
+        worker_id = self._next_id
+        self._next_id += 1
+        conn, child_conn = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=_extract_loop, args=(child_conn,), daemon=True)
+        proc.start()
+        child_conn.close()
+        self.workers[worker_id] = {'proc': proc, 'conn': conn, 'path': None, 'started': 0.0}
+
+    def _kill(self, worker_id):
+        worker = self.workers.pop(worker_id)
+        worker['proc'].terminate()
+        worker['proc'].join()
+        worker['conn'].close()
+
+    def imap_unordered(self, paths):
+        """(path, (lines, line_words, pages, stats)) 를 끝난 순서대로 돌려준다.
+
+        시간 초과나 워커가 죽은 파일은 빈 본문과 stats['error'] 로 돌려준다.
+
+        paths는 IDLE을 내놓아 아직 줄 파일이 없음을 알릴 수 있다 (폴더 탐색과 동시에 돌릴 때).
+        """
+        pending = iter(paths)
+        exhausted = False
+        busy = 0
+        while True:
+            if not exhausted:
+                for worker in self.workers.values():
+                    if worker['path'] is not None:
+                        continue
+                    path = next(pending, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    if path is IDLE:
+                        break
+                    worker['path'], worker['started'] = path, time.monotonic()
+                    worker['conn'].send(path)
+                    busy += 1
+            if exhausted and busy == 0:
+                return
+            if busy == 0:
+                continue  # 기다릴 결과가 없다. 다음 파일을 기다리는 일은 paths 쪽에서 한다.
+
+            # 쉬는 워커가 있으면 결과만 확인하고 바로 다음 파일을 받으러 간다
+            conns = {worker['conn']: worker for worker in self.workers.values() if worker['path'] is not None}
+            timeout = 0.5 if exhausted or busy == len(self.workers) else 0
+            for conn in multiprocessing.connection.wait(list(conns), timeout):
+                try:
+                    path, result = conn.recv()
+                except (EOFError, OSError):
+                    continue  # 워커가 죽었다. 아래에서 실패로 돌려준다.
+                conns[conn]['path'] = None
+                busy -= 1
+                yield path, result
+
+            now = time.monotonic()
+            for worker_id, worker in list(self.workers.items()):
+                if worker['path'] is None:
+                    continue
+                elapsed = now - worker['started']
+                if elapsed > self.timeout or not worker['proc'].is_alive():
+                    path = worker['path']
+                    error = f'{self.timeout}초 시간 초과' if elapsed > self.timeout else '추출 프로세스 종료'
+                    self._kill(worker_id)
+                    self._spawn()
+                    busy -= 1
+                    yield path, failed_result(path, elapsed, error)
+
+    def close(self):
+        for worker in self.workers.values():
+            if worker['path'] is None:
+                try:
+                    worker['conn'].send(None)
+                except OSError:
+                    pass  # 이미 죽은 워커
+        for worker_id in list(self.workers):
+            worker = self.workers[worker_id]
+            worker['proc'].join(timeout=1)
+            if worker['proc'].is_alive():
+                self._kill(worker_id)
+            else:
+                worker['conn'].close()
+        self.workers.clear()
+
+# ---------------------
+# File Finder
+# ---------------------
+def is_hidden(entry):
+    if entry.name.startswith(('.', '~$')):  # 숨김 파일, Office 임시 파일 (~$보고서.docx)
+        return True
+    if os.name != 'nt':
+        return False  # 속성 비트는 Windows에만 있다 (다른 OS에서 파일마다 lstat 하지 않는다)
+    return bool(entry.stat(follow_symlinks=False).st_file_attributes & 0x2)  # FILE_ATTRIBUTE_HIDDEN
+
+def walk_office_files(directory, recursive=True, include=INCLUDE_PATTERNS, exclude=EXCLUDE_PATTERNS):
+    """os.scandir로 트리를 한 번만 훑으며 찾는 대로 Path를 내놓는다."""
+    include = [pattern.lower() for pattern in include]
+    exclude = [pattern.lower() for pattern in exclude]
+    stack = [str(directory)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if is_hidden(entry):
+                    continue
+                path = entry.path.replace(os.sep, '/').lower()
+                if any(fnmatch.fnmatchcase(path, pattern) for pattern in exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(entry.path)
+                elif any(fnmatch.fnmatchcase(entry.name.lower(), pattern) for pattern in include):
+                    yield Path(entry.path)
+            except OSError:
+                continue
+
+def find_office_files(directory, recursive=True):
+    return list(walk_office_files(directory, recursive))
+
+def walk_into_queue(directory, out):
+    # 폴더 탐색 스레드: 찾은 파일을 바로 큐에 넣고 끝나면 None
+    try:
+        for path in walk_office_files(directory):
+            out.put(path)
+    finally:
+        out.put(None)
+
+# ---------------------
+# File Manifest
+# ---------------------
+def content_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def in_scope(file, scope):
+    # scope: [(폴더, 하위 폴더 포함 여부), ...]
+    for folder, recursive in scope:
+        if file.parent == folder or (recursive and folder in file.parents):
+            return True
+    return False
+
+def check_file(file, old, use_hash=HASH_CONTENT):
+    """예전 manifest 항목과 비교해 (새 항목, 다시 추출할지) 를 돌려준다. 못 읽으면 (None, False)."""
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None, False
+    entry = {'mtime': st.st_mtime, 'size': st.st_size, 'hash': None}
+    if old and old['mtime'] == entry['mtime'] and old['size'] == entry['size']:
+        return old, False
+    if use_hash:
+        try:
+            entry['hash'] = content_hash(file)
+        except OSError:
+            return None, False
+        if old and old['hash'] == entry['hash']:
+            return dict(old, **entry), False  # 세그먼트 위치는 그대로
+    return entry, True
+
+def ensure_hash(file, entry):
+    """색인된 내용의 해시를 entry에 채워 돌려준다. 색인한 뒤로 파일이 바뀌었으면 None."""
+    if entry.get('hash') is None:
+        try:
+            st = os.stat(file)
+            if st.st_mtime != entry['mtime'] or st.st_size != entry['size']:
+                return None
+            entry['hash'] = content_hash(file)
+        except OSError:
+            return None
+    return entry['hash']
+
+def locations(manifest):
+    """{(세그먼트, doc id): [경로, ...]} — 같은 내용의 사본은 한 문서를 같이 가리킨다."""
+    paths = {}
+    for file, entry in manifest.items():
+        if 'segment' in entry:
+            paths.setdefault((entry['segment'], entry['doc']), []).append(file)
+    return paths
+
+def split_manifest(manifest, scope=None):
+    """(그대로 둘 항목, 이번에 다시 확인할 항목). scope가 없으면 전부 다시 확인한다."""
+    if scope is None:
+        return {}, dict(manifest)
+    kept = {file: entry for file, entry in manifest.items() if not in_scope(file, scope)}
+    return kept, {file: entry for file, entry in manifest.items() if file not in kept}
+
+# ---------------------
+# Extraction Profile
+# ---------------------
+PROFILE_FIELDS = ('files', 'failed', 'truncated', 'bytes', 'lines', 'tokens',
+                  'parse_seconds', 'tokenize_seconds', 'index_seconds')
+
+class ExtractionProfile:
+    """파일별 추출 통계를 모아 파일 종류별 합계와 느린/실패 파일 보고서를 만든다.
+
+    파일마다 다 들고 있지 않고 종류별 합계, 가장 느린 SLOW_FILES 개, 실패 목록만 남긴다.
+    """
+
+    def __init__(self, slow_files=SLOW_FILES, max_failures=MAX_FAILURES):
+        self.slow_files = slow_files
+        self.max_failures = max_failures
+        self.types = {}
+        self.slowest = []  # (걸린 시간, 경로, stats) 최소 힙
+        self.failures = []
+        self.failure_count = 0
+        self.duplicates = 0  # 같은 내용의 파일이 이미 있어 추출하지 않은 파일 수
+
+    def add(self, path, stats):
+        total = self.types.setdefault(Path(path).suffix.lower(), dict.fromkeys(PROFILE_FIELDS, 0))
+        total['files'] += 1
+        total['failed'] += stats['error'] is not None
+        total['truncated'] += stats['truncated'] is not None
+        for field in PROFILE_FIELDS[3:]:
+            total[field] += stats.get(field, 0)
+
+        entry = (stats['parse_seconds'] + stats['tokenize_seconds'], str(path), stats)
+        if len(self.slowest) < self.slow_files:
+            heapq.heappush(self.slowest, entry)
+        elif entry[:2] > self.slowest[0][:2]:
+            heapq.heapreplace(self.slowest, entry)
+        if stats['error'] is not None:
+            self.failure_count += 1
+            if len(self.failures) < self.max_failures:
+                self.failures.append((str(path), stats['error']))
+
+    def summary(self):
+        """JSON으로 남길 수 있는 dict."""
+        return {
+            'types': self.types,
+            'slowest': [dict(stats, path=path) for _, path, stats in sorted(self.slowest, reverse=True)],
+            'failures': [{'path': path, 'error': error} for path, error in self.failures],
+            'failure_count': self.failure_count,
+            'duplicates': self.duplicates,
+        }
+
+    def report(self):
+        files = sum(total['files'] for total in self.types.values())
+        out = [f'추출 보고서: 파일 {files}개, 실패 {self.failure_count}개, '
+               f'같은 내용이라 건너뛴 파일 {self.duplicates}개', '',
+               f"{'종류':<6}{'파일':>7}{'실패':>6}{'잘림':>6}{'MB':>9}{'줄':>10}{'단어':>11}"
+               f"{'추출(초)':>10}{'토큰화(초)':>10}{'색인(초)':>9}"]
+        for kind, total in sorted(self.types.items()):
+            out.append(f"{kind or '-':<8}{total['files']:>7}{total['failed']:>8}{total['truncated']:>8}"
+                       f"{total['bytes'] / (1024 * 1024):>9.1f}{total['lines']:>11}{total['tokens']:>12}"
+                       f"{total['parse_seconds']:>12.2f}{total['tokenize_seconds']:>13.2f}"
+                       f"{total['index_seconds']:>11.2f}")
+        if self.slowest:
+            out += ['', '가장 느린 파일:']
+            for seconds, path, stats in sorted(self.slowest, reverse=True):
+                note = stats['error'] or stats['truncated'] or ''
+                out.append(f"{seconds:8.2f}초 {stats['bytes'] / (1024 * 1024):8.1f} MB "
+                           f"{stats['tokens']:>9} 단어  {path}  {note}".rstrip())
+        if self.failures:
+            out += ['', '실패한 파일:']
+            out += [f'  {path}: {error}' for path, error in self.failures]
+            if self.failure_count > len(self.failures):
+                out.append(f'  ... 외 {self.failure_count - len(self.failures)}개')
+        return '\n'.join(out) + '\n'
+
+    def write(self, path=EXTRACT_REPORT_FILE):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report())
+
+# ---------------------
+# Indexer
+# ---------------------
+class Indexer:
+    """바뀐 파일만 다시 추출해서 새 세그먼트로 쓰고, 예전 세그먼트의 그 문서는 삭제로 표시한다.
+
+    progress 는 (확인한 파일 수, 추출한 파일 수, 초당 확인 파일 수) 를 받는 함수.
+    run 이 끝나면 profile 에 이번에 추출한 파일들의 ExtractionProfile 이 남는다.
+
+    이미 색인된 파일과 내용이 같은 파일은 추출하지 않고 manifest에서 그 문서를 같이 가리키게
+    한다. 해시는 크기가 같은 파일이 있을 때만 계산한다. 문서는 가리키는 파일이 하나도 남지
+    않을 때만 지운다.
+    """
+
+    def __init__(self, files=None, state=None, manifest=None, processes=None, scope=None, folder=None,
+                 progress=None):
+        # folder를 주면 탐색 스레드가 찾는 대로 흘려보내고, 아니면 files 목록을 쓴다
+        self.files = files
+        self.folder = folder
+        self.state = state or empty_state()
+        self.manifest = manifest or {}
+        self.processes = processes
+        self.scope = scope
+        self.progress = progress
+        self.profile = ExtractionProfile()
+        self._started = 0.0
+        self._last_report = 0.0
+
+    def iter_files(self):
+        if self.folder is None:
+            yield from self.files
+            return
+        found = queue.Queue(maxsize=WALK_QUEUE_SIZE)
+        walker = threading.Thread(target=walk_into_queue, args=(self.folder, found), daemon=True)
+        walker.start()
+        while True:
+            try:
+                path = found.get(timeout=0.1)
+            except queue.Empty:
+                yield IDLE
+                continue
+            if path is None:
+                return
+            yield path
+
+    def report(self, checked, extracted, force=False):
+        now = time.monotonic()
+        if self.progress is not None and (force or now - self._last_report >= 0.25):
+            self._last_report = now
+            self.progress(checked, extracted, checked / max(now - self._started, 1e-6))
+
+    def find_copy(self, file, entry, sizes):
+        """같은 내용으로 이미 색인됐거나 이번에 추출 중인 (경로, 항목). 없으면 None."""
+        peers = sizes.get(entry['size'])
+        if not peers or ensure_hash(file, entry) is None:
+            return None
+        for peer_file, peer in peers:
+            if ensure_hash(peer_file, peer) == entry['hash']:
+                return peer_file, peer
+        return None
+
+    def changed_files(self, candidates, manifest, deleted, waiting, counts):
+        # 찾은 파일을 manifest와 비교하면서 다시 추출할 파일만 흘려보낸다
+        sizes = {}
+        for entries in (manifest, candidates):
+            for file, entry in entries.items():
+                if 'segment' in entry:
+                    sizes.setdefault(entry['size'], []).append((file, entry))
+        for file in self.iter_files():
+            if file is IDLE:
+                yield IDLE
+                continue
+            old = candidates.get(file)
+            entry, extract = check_file(file, old)
+            counts['checked'] += 1
+            if entry is not None:
+                manifest[file] = entry
+                if extract:
+                    if old and 'segment' in old:
+                        deleted.append((old['segment'], old['doc']))
+                    copy = self.find_copy(file, entry, sizes)
+                    if copy is None:
+                        sizes.setdefault(entry['size'], []).append((file, entry))
+                        yield file
+                    elif 'segment' in copy[1]:
+                        entry['segment'], entry['doc'] = copy[1]['segment'], copy[1]['doc']
+                        self.profile.duplicates += 1
+                    else:
+                        waiting.setdefault(copy[0], []).append(file)  # 원본 추출이 끝나면 채운다
+                        self.profile.duplicates += 1
+                elif counts['checked'] % 64 == 0:
+                    yield IDLE  # 바뀐 파일이 없어도 가끔 돌려줘서 추출 결과를 받게 한다
+            self.report(counts['checked'], counts['extracted'])
+
+    def run(self):
+        """(새 state, 새 manifest, 파일 수, 새로 추출한 파일 수).
+
+        manifest가 없는 옛 색인은 어떤 파일이 들어 있는지 모르므로 세그먼트를 모두 새로 만든다.
+        """
+        manifest, candidates = split_manifest(self.manifest, self.scope)
+        deleted = []
+        waiting = {}
+        counts = {'checked': 0, 'extracted': 0}
+        self._started = time.monotonic()
+
+        processes = self.processes or os.cpu_count() or 1
+        if self.folder is None:
+            processes = min(processes, max(len(self.files), 1))
+        os.makedirs(SEGMENT_DIR, exist_ok=True)
+        files = self.changed_files(candidates, manifest, deleted, waiting, counts)
+        with ExtractionPool(processes) as pool, \
+                SegmentWriter(SEGMENT_DIR, self.state['next'], ngrams=NGRAM_INDEX) as segments_out:
+            for file, (lines, line_words, pages, stats) in pool.imap_unordered(files):
+                started = time.perf_counter()
+                location = segments_out.add(file, tokenize(Path(file).stem), line_words, lines, pages)
+                for same in [file] + waiting.pop(file, []):
+                    manifest[same]['segment'], manifest[same]['doc'] = location
+                stats['index_seconds'] = time.perf_counter() - started
+                self.profile.add(file, stats)
+
+                counts['extracted'] += 1
+                self.report(counts['checked'], counts['extracted'])
+        deleted.extend((entry['segment'], entry['doc']) for file, entry in candidates.items()
+                       if file not in manifest and 'segment' in entry)
+        if deleted:
+            # 사본이 아직 가리키는 문서는 남긴다
+            referenced = {(entry['segment'], entry['doc']) for entry in manifest.values() if 'segment' in entry}
+            deleted = [location for location in set(deleted) if location not in referenced]
+        state = commit_segments(self.state, segments_out.written, deleted, segments_out.next_number,
+                                replace=not self.manifest)
+        self.report(counts['checked'], counts['extracted'], force=True)
+        return state, manifest, len(manifest), counts['extracted']
+
+def remap_manifest(manifest, old_state, new_state, remap):
+    # 세그먼트를 합친 뒤 manifest의 (세그먼트, doc id) 를 새 세그먼트 기준으로 고친다
+    old_names = {info['name'] for info in old_state['segments']}
+    new_names = {info['name'] for info in new_state['segments']}
+    merged, created = old_names - new_names, new_names - old_names
+    for entry in manifest.values():
+        if entry.get('segment') in merged:
+            new_doc = remap.get((entry['segment'], entry['doc']))
+            if new_doc is not None:
+                entry['segment'], entry['doc'] = next(iter(created)), new_doc
+
+# ---------------------
+# Search Store
+# ---------------------
+class DocSearch:
+    """디스크의 색인 (세그먼트 목록, manifest, 색인한 폴더) 과 검색을 묶어 둔다.
+
+    GUI와 데몬이 하나씩 들고 있다. 색인이 바뀌는 동안 검색이 돌지 않게 하는 것은 쓰는 쪽 몫이다.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.state = empty_state()
+        self.manifest = {}
+        self.indexed_folder = None
+        self.paths = {}  # (세그먼트, doc id) -> 그 문서를 가리키는 모든 경로
+        self.query_cache = QueryCache(QUERY_CACHE_SIZE)
+
+    def load(self):
+        """저장된 색인을 연다. 예전 단일 색인/pickle 색인은 세그먼트로 옮긴다. 색인이 있으면 True."""
+        state = load_state(SEGMENT_DIR) if os.path.isdir(SEGMENT_DIR) else None
+        if state is None and not os.path.exists(INDEX_FILE) and os.path.exists(LEGACY_INDEX_FILE):
+            convert_pickle_index(LEGACY_INDEX_FILE, INDEX_FILE, LEGACY_LINE_MAP_FILE, LINE_STORE_FILE)
+        if os.path.exists(MANIFEST_FILE):
+            with open(MANIFEST_FILE, 'rb') as f:
+                self.manifest = pickle.load(f)
+        if state is None and os.path.exists(INDEX_FILE):
+            os.makedirs(SEGMENT_DIR, exist_ok=True)
+            try:
+                state = adopt_index(SEGMENT_DIR, INDEX_FILE, LINE_STORE_FILE, self.manifest)
+            except ValueError:
+                # 예전 형식의 색인은 버리고 다음 색인 때 새로 만든다
+                self.manifest = {}
+                return False
+            with open(MANIFEST_FILE, 'wb') as f:
+                pickle.dump(self.manifest, f)
+        if state is None:
+            return False
+        self.state = state
+        remove_unused(SEGMENT_DIR, state)
+        self.index = SegmentedIndex(SEGMENT_DIR, state)
+        self.paths = locations(self.manifest)
+        if os.path.exists(FOLDER_FILE):
+            with open(FOLDER_FILE, encoding='utf-8') as f:
+                self.indexed_folder = Path(f.read().strip())
+        return True
+
+    def save(self):
+        # 세그먼트 파일은 이미 써 있으므로 목록만 바꿔 저장한다
+        os.makedirs(SEGMENT_DIR, exist_ok=True)
+        save_state(SEGMENT_DIR, self.state)
+        remove_unused(SEGMENT_DIR, self.state)
+        self.index = SegmentedIndex(SEGMENT_DIR, self.state)
+        self.paths = locations(self.manifest)
+        with open(MANIFEST_FILE, 'wb') as f:
+            pickle.dump(self.manifest, f)
+        if self.indexed_folder is not None:
+            with open(FOLDER_FILE, 'w', encoding='utf-8') as f:
+                f.write(str(self.indexed_folder))
+
+    def close(self):
+        # Windows에서는 mmap으로 열린 파일을 지울 수 없으므로 안 쓰는 세그먼트를 지우기 전에 닫는다
+        self.query_cache.clear()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def apply_index(self, state, manifest):
+        """Indexer.run 결과로 바꿔서 저장한다."""
+        self.close()
+        self.state = state
+        self.manifest = manifest
+        self.save()
+
+    def apply_merge(self, state, remap):
+        """merge_segments 결과로 바꿔서 저장한다."""
+        self.close()
+        remap_manifest(self.manifest, self.state, state, remap)
+        self.state = state
+        self.save()
+
+    def merge_all(self):
+        # 합칠 세그먼트가 없어질 때까지 그 자리에서 합친다 (명령줄 도구용)
+        names = plan_merge(self.state)
+        while names:
+            self.apply_merge(*merge_segments(SEGMENT_DIR, self.state, names, ngrams=NGRAM_INDEX))
+            names = plan_merge(self.state)
+
+    def cached(self, text):
+        return self.query_cache.get(text)
+
+    def search(self, text, cancelled=None):
+        """BM25 상위 문서 [(점수, doc_id, [줄 번호...], 경로), ...]. 취소되면 QueryCancelled.
+
+        같은 내용의 사본이 여러 곳에 있으면 경로마다 한 줄씩 돌려준다.
+        """
+        if self.index is None:
+            return []
+        results = self.query_cache.get(text)
+        if results is None:
+            results = []
+            for score, doc_id, lines in QueryEngine(self.index, self.line_text, cancelled).rank(text):
+                paths = self.paths.get(self.index.location(doc_id)) or [self.index.doc_path(doc_id)]
+                results.extend((score, doc_id, lines, path) for path in sorted(paths))
+            self.query_cache.put(text, results)
+        return results
+
+    def describe(self, result):
+        """(표시 문자열, 파일 경로). 첫 본문 일치 줄을 보여주고, 본문 일치가 없으면 제목 일치."""
+        _, doc_id, lines, file = result
+        body_lines = [line for line in lines if line != -1]
+        if not body_lines:
+            return f"[제목 일치] {file}", str(file)
+        line_num = body_lines[0]
+        more = f" 외 {len(body_lines) - 1}곳" if len(body_lines) > 1 else ""
+        line = self.index.line(doc_id, line_num)
+        page = self.index.page_of(doc_id, line_num)
+        if page:
+            display = f"{file} (페이지 {page[0]}, 줄 {page[1]}{more}): {line}"
+        else:
+            display = f"{file} (줄 {line_num+1}{more}): {line}"
+        return display, str(file)
+
+    def line_text(self, doc_id, line_num):
+        return self.index.line(doc_id, line_num)
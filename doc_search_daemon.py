@@ -0,0 +1,182 @@
+# doc_search_daemon.py
+# 문서 검색 데몬: 색인을 한 번만 열어 두고 로컬 HTTP로 검색을 받는다 (PyQt5 없이 돈다)
+#
+#   GET  /search?q=검색어&k=100&offset=0   {"results": [{"score", "path", "text", "lines"}, ...]}
+#   GET  /status                           {"documents", "segments", "folder", "indexing", "extract"}
+#                                          extract 는 마지막 색인의 파일 종류별 추출 통계와 느린/실패 파일
+#   POST /index  {"folder": 경로}          색인을 백그라운드에서 시작 (없으면 마지막에 색인한 폴더)
+#
+# 127.0.0.1 에서만 받는다. 색인과 세그먼트 병합은 데몬 안의 스레드 하나가 차례로 한다.
+import json
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from segments import plan_merge, merge_segments
+from doc_search_core import DocSearch, Indexer, SEGMENT_DIR, NGRAM_INDEX, EXTRACT_REPORT_FILE
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+DAEMON_URL = f'http://{DAEMON_HOST}:{DAEMON_PORT}'
+RESULT_LIMIT = 100  # /search 가 한 번에 돌려줄 기본 문서 수
+MAX_RESULT_LIMIT = 1000  # /search 의 k 상한
+
+def result_json(store, result):
+    score, _, lines, _ = result
+    text, path = store.describe(result)
+    return {'score': score, 'path': path, 'text': text, 'lines': lines}
+
+# ---------------------
+# Daemon
+# ---------------------
+class SearchDaemon:
+    def __init__(self):
+        self.store = DocSearch()
+        self.store.load()
+        self.lock = threading.Lock()  # 검색과 색인 교체가 겹치지 않게 한다
+        self.index_lock = threading.Lock()  # 색인 스레드를 두 개 띄우지 않게 한다
+        self.indexing = None
+        self.profile = None  # 마지막 색인의 ExtractionProfile
+
+    def search(self, text, k=RESULT_LIMIT, offset=0):
+        with self.lock:
+            results = self.store.search(text)[offset:offset + k]
+            return [result_json(self.store, result) for result in results]
+
+    def status(self):
+        with self.lock:
+            index = self.store.index
+            return {
+                'documents': index.doc_count if index is not None else 0,
+                'segments': len(self.store.state['segments']),
+                'folder': str(self.store.indexed_folder) if self.store.indexed_folder else None,
+                'indexing': self.indexing is not None and self.indexing.is_alive(),
+                'extract': self.profile.summary() if self.profile is not None else None,
+            }
+
+    def start_index(self, folder=None):
+        """색인 스레드를 띄운다. 이미 색인 중이면 False."""
+        with self.index_lock:
+            if self.indexing is not None and self.indexing.is_alive():
+                return False
+            folder = Path(folder) if folder else self.store.indexed_folder
+            if folder is None or not folder.is_dir():
+                raise ValueError(f'색인할 폴더가 없습니다: {folder}')
+            self.indexing = threading.Thread(target=self._index, args=(folder,), daemon=True)
+            self.indexing.start()
+            return True
+
+    def _index(self, folder):
+        # 추출은 잠금 없이 하고, 색인을 바꿔 끼울 때만 검색을 잠깐 막는다
+        with self.lock:
+            state, manifest = self.store.state, self.store.manifest
+        indexer = Indexer(state=state, manifest=manifest, folder=folder)
+        state, manifest, _, _ = indexer.run()
+        indexer.profile.write(EXTRACT_REPORT_FILE)
+        with self.lock:
+            self.profile = indexer.profile
+            self.store.indexed_folder = folder
+            self.store.apply_index(state, manifest)
+        names = plan_merge(self.store.state)
+        while names:
+            merged = merge_segments(SEGMENT_DIR, self.store.state, names, ngrams=NGRAM_INDEX)
+            with self.lock:
+                self.store.apply_merge(*merged)
+            names = plan_merge(self.store.state)
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        daemon = self.server.search_daemon
+        if url.path == '/search':
+            try:
+                k = min(max(int(query.get('k', [RESULT_LIMIT])[0]), 0), MAX_RESULT_LIMIT)
+                offset = max(int(query.get('offset', [0])[0]), 0)
+            except ValueError:
+                self.reply(400, {'error': 'k, offset은 숫자여야 합니다'})
+                return
+            self.reply(200, {'results': daemon.search(query.get('q', [''])[0], k, offset)})
+        elif url.path == '/status':
+            self.reply(200, daemon.status())
+        else:
+            self.reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/index':
+            self.reply(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict) or not isinstance(body.get('folder'), (str, type(None))):
+                raise ValueError('본문은 {"folder": 경로 문자열} 이어야 합니다')
+            started = self.server.search_daemon.start_index(body.get('folder'))
+        except ValueError as e:
+            self.reply(400, {'error': str(e)})
+            return
+        self.reply(202 if started else 409, {'started': started})
+
+    def reply(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 콘솔에 찍지 않는다
+
+def serve(host=DAEMON_HOST, port=DAEMON_PORT):
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.search_daemon = SearchDaemon()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.search_daemon.store.close()
+
+# ---------------------
+# Client
+# ---------------------
+class DaemonClient:
+    """GUI와 명령줄 도구가 데몬에 붙을 때 쓴다. 연결 실패는 OSError (URLError) 로 올라온다."""
+
+    def __init__(self, url=DAEMON_URL, timeout=10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, url=DAEMON_URL, timeout=0.5):
+        # 데몬이 떠 있으면 클라이언트, 아니면 None
+        client = cls(url)
+        try:
+            client.status(timeout)
+        except (OSError, ValueError):
+            return None
+        return client
+
+    def _request(self, path, params=None, body=None, timeout=None):
+        url = self.url + path + (f'?{urlencode(params)}' if params else '')
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = Request(url, data=data, headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=timeout or self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def status(self, timeout=None):
+        return self._request('/status', timeout=timeout)
+
+    def search(self, text, k=RESULT_LIMIT, offset=0):
+        return self._request('/search', {'q': text, 'k': k, 'offset': offset})['results']
+
+    def index(self, folder=None):
+        """데몬에 색인을 맡긴다. 이미 색인 중이면 False."""
+        try:
+            return self._request('/index', body={'folder': str(folder) if folder else None})['started']
+        except HTTPError as e:
+            if e.code == 409:
+                return False
+            raise
@@ -0,0 +1,148 @@
+# fuzzy_index.py
+# 역색인 검색 앱(app2.py)의 오타 교정용 단어 색인 (SymSpell 방식 삭제 색인)
+#
+# 단어마다 앞 PREFIX_LENGTH 글자에서 글자를 MAX_DISTANCE 개까지 지운 변형을 모두 키로 만들고
+# 키 -> 단어 번호 목록을 들고 있는다. 검색어도 같은 방식으로 지운 변형을 만들어 키를 찾으면
+# 편집 거리가 MAX_DISTANCE 이내일 수 있는 단어만 후보로 나오고, 후보는 실제 편집 거리로
+# 다시 확인한다. 어휘 전체를 훑지 않으므로 단어 수가 늘어도 찾는 시간은 거의 그대로다.
+#
+#   fuzzy_index.json : {'max_distance', 'prefix_length', 'words': [단어...],
+#                       'deletes': {변형: [단어 번호...]}}
+# 지운 단어의 번호는 words에 None으로 남겨 두고 다시 쓰지 않는다.
+import json
+import os
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7  # 긴 단어는 앞부분만 변형을 만든다 (색인 크기 상한)
+
+def distance_limit(word):
+    """단어 길이의 40% 정도 (difflib cutoff 0.6 과 비슷). 짧은 단어에 2글자 오타를 허용하면
+    엉뚱한 단어가 맞는다."""
+    return min(MAX_DISTANCE, max(1, len(word) * 2 // 5))
+
+def deletes(word, distance):
+    """word에서 글자를 distance 개까지 지운 변형 전부 (word 자신 포함)."""
+    result = {word}
+    frontier = [word]
+    for _ in range(distance):
+        next_frontier = []
+        for variant in frontier:
+            if len(variant) <= 1:
+                continue
+            for i in range(len(variant)):
+                deleted = variant[:i] + variant[i + 1:]
+                if deleted not in result:
+                    result.add(deleted)
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return result
+
+def edit_distance(a, b, limit):
+    """인접 글자 바꿈을 한 번으로 치는 편집 거리. limit을 넘으면 limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        # 바꿈은 두 줄 위에서 1을 더하므로 두 줄 모두 limit을 넘어야 끝낼 수 있다
+        if min(current) > limit and min(previous) >= limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+def suggest(word, candidates, index_distance, prefix_length, max_distance=None):
+    """candidates(변형) 이 그 변형 키에 걸린 단어들을 돌려줄 때 가까운 단어 목록을 만든다.
+    FuzzyIndex 와 shared_index.py 의 mmap 색인이 같이 쓴다."""
+    if max_distance is None:
+        max_distance = distance_limit(word)
+    max_distance = min(max_distance, index_distance)
+    seen = set()
+    result = []
+    for variant in deletes(word[:prefix_length], max_distance):
+        for candidate in candidates(variant):
+            if candidate in seen:
+                continue
+            seen.add(candidate)
+            distance = edit_distance(word, candidate, max_distance)
+            if distance <= max_distance:
+                result.append((distance, candidate))
+    result.sort()
+    return result
+
+def closest(suggestions, frequency):
+    """suggest 결과 중 가장 가까운 단어 하나. 거리가 같으면 frequency(단어) 가 큰 단어."""
+    if not suggestions:
+        return None
+    return min(suggestions, key=lambda item: (item[0], -frequency(item[1])))[1]
+
+class FuzzyIndex:
+    def __init__(self, max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.deletes = {}
+        self._ids = {}
+
+    @classmethod
+    def build(cls, words, **kwargs):
+        index = cls(**kwargs)
+        for word in words:
+            index.add(word)
+        return index
+
+    def add(self, word):
+        if word in self._ids:
+            return
+        word_id = len(self.words)
+        self.words.append(word)
+        self._ids[word] = word_id
+        for variant in deletes(word[:self.prefix_length], self.max_distance):
+            self.deletes.setdefault(variant, []).append(word_id)
+
+    def remove(self, word):
+        word_id = self._ids.pop(word, None)
+        if word_id is None:
+            return
+        self.words[word_id] = None
+        for variant in deletes(word[:self.prefix_length], self.max_distance):
+            ids = self.deletes.get(variant)
+            if ids is not None:
+                ids.remove(word_id)
+                if not ids:
+                    del self.deletes[variant]
+
+    def __contains__(self, word):
+        return word in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def suggest(self, word, max_distance=None):
+        """편집 거리 max_distance 이내의 단어를 [(거리, 단어), ...] 가까운 순으로 돌려준다."""
+        def candidates(variant):
+            return (self.words[word_id] for word_id in self.deletes.get(variant, ()))
+        return suggest(word, candidates, self.max_distance, self.prefix_length, max_distance)
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'max_distance': self.max_distance, 'prefix_length': self.prefix_length,
+                       'words': self.words, 'deletes': self.deletes}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(data['max_distance'], data['prefix_length'])
+        index.words = data['words']
+        index.deletes = data['deletes']
+        index._ids = {word: word_id for word_id, word in enumerate(index.words) if word is not None}
+        return index
@@ -0,0 +1,530 @@
+# index_format.py
+# 문서 검색 앱의 색인 파일 형식 (pickle 대신 mmap으로 여는 바이너리 파일)
+#
+#   header   : magic, version, doc_count, term_count, gram_count, 각 구역의 시작 위치,
+#              전체 단어 수 (BM25 평균 문서 길이용)
+#   docs     : doc_count+1 개의 (경로 오프셋, 본문 레코드 오프셋, 단어 수) u64 + utf-8 경로 blob
+#              본문 레코드는 같은 세그먼트의 본문 저장소 (line_store.py) 안 위치
+#   terms    : term_count+1 개의 (term 오프셋, postings 오프셋) u64 쌍 + utf-8 단어 blob
+#              단어는 utf-8 바이트 순으로 정렬되어 있어 이진 탐색이 가능하다
+#   postings : 단어마다 varint 개수, 블록 표, 블록들
+#              posting BLOCK_SIZE 개가 한 블록이며 블록 표에는 블록의 첫 doc id 차이와
+#              블록 바이트 길이가 varint로 들어 있다 (skip pointer).
+#              블록 안은 (doc 차이, 줄 번호 차이) varint 쌍이고 블록마다 차이 계산을 새로 시작한다.
+#   grams    : 단어 목록의 글자 bigram 색인 (부분 문자열 검색용, NGRAM_SIZE 글자)
+#              gram_count+1 개의 (gram 오프셋, 목록 오프셋) u64 쌍 + utf-8 gram blob
+#              gram마다 varint 개수 + 그 gram을 포함하는 단어 순번 차이 varint
+#
+# 줄 번호는 +1 해서 저장한다 (제목 일치 -1 -> 0).
+import os
+import sys
+import mmap
+import pickle
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from line_store import LineStoreWriter, NO_RECORD
+
+MAGIC = b'DIDX'
+VERSION = 6
+BLOCK_SIZE = 128
+NGRAM_SIZE = 2
+HEADER = struct.Struct('<4s5I8Q')
+PAIR = struct.Struct('<QQ')
+DOC_ENTRY = struct.Struct('<QQQ')
+
+# ---------------------
+# Varint
+# ---------------------
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+def encode_postings(postings, out):
+    """정렬된 (doc_id, slot) 쌍들을 블록 단위 delta + varint로 붙인다. slot = 줄 번호 + 1."""
+    encode_varint(len(postings), out)
+    blocks = []
+    for start in range(0, len(postings), BLOCK_SIZE):
+        block = bytearray()
+        prev_doc, prev_slot = -1, 0
+        for doc_id, slot in postings[start:start + BLOCK_SIZE]:
+            if doc_id == prev_doc:
+                encode_varint(0, block)
+                encode_varint(slot - prev_slot, block)
+            else:
+                encode_varint(doc_id - prev_doc, block)
+                encode_varint(slot, block)
+            prev_doc, prev_slot = doc_id, slot
+        blocks.append((postings[start][0], block))
+    prev_first = 0
+    for first, block in blocks:
+        encode_varint(first - prev_first, out)
+        encode_varint(len(block), out)
+        prev_first = first
+    for _, block in blocks:
+        out += block
+
+class TermPostings:
+    """한 단어의 postings. 블록 표만 먼저 읽고, 블록은 필요할 때 푼다."""
+
+    def __init__(self, buf, pos):
+        self._buf = buf
+        self.count, pos = decode_varint(buf, pos)
+        self.firsts = []
+        self._starts = []
+        first = start = 0
+        for _ in range(-(-self.count // BLOCK_SIZE)):
+            delta, pos = decode_varint(buf, pos)
+            length, pos = decode_varint(buf, pos)
+            first += delta
+            self.firsts.append(first)
+            self._starts.append(start)
+            start += length
+        self._data = pos
+        self._block_cache = (None, None)
+
+    def __len__(self):
+        return self.count
+
+    def block(self, b):
+        """b번째 블록의 (doc_id, slot) 목록."""
+        if self._block_cache[0] == b:
+            return self._block_cache[1]
+        pos = self._data + self._starts[b]
+        pairs = []
+        doc_id, slot = -1, 0
+        for _ in range(min(BLOCK_SIZE, self.count - b * BLOCK_SIZE)):
+            delta, pos = decode_varint(self._buf, pos)
+            value, pos = decode_varint(self._buf, pos)
+            if delta:
+                doc_id += delta
+                slot = value
+            else:
+                slot += value
+            pairs.append((doc_id, slot))
+        self._block_cache = (b, pairs)
+        return pairs
+
+    def __iter__(self):
+        for b in range(len(self.firsts)):
+            yield from self.block(b)
+
+    def slots_of(self, doc_id):
+        """skip pointer로 doc_id가 있을 블록만 풀어 그 문서의 slot 목록을 돌려준다."""
+        b = max(bisect_left(self.firsts, doc_id) - 1, 0)
+        slots = []
+        while b < len(self.firsts) and self.firsts[b] <= doc_id:
+            for d, slot in self.block(b):
+                if d == doc_id:
+                    slots.append(slot)
+                elif d > doc_id:
+                    return slots
+            b += 1
+        return slots
+
+def char_ngrams(term, n=NGRAM_SIZE):
+    return {term[i:i + n] for i in range(len(term) - n + 1)}
+
+def encode_ids(ids, out):
+    encode_varint(len(ids), out)
+    prev = 0
+    for value in ids:
+        encode_varint(value - prev, out)
+        prev = value
+
+def decode_ids(buf, pos):
+    count, pos = decode_varint(buf, pos)
+    ids = array('I')
+    value = 0
+    for _ in range(count):
+        delta, pos = decode_varint(buf, pos)
+        value += delta
+        ids.append(value)
+    return ids
+
+def decode_postings(buf, pos):
+    """(doc_id, slot) 를 doc, slot 순서로 펼친 array('I') 를 돌려준다."""
+    postings = array('I')
+    for doc_id, slot in TermPostings(buf, pos):
+        postings.append(doc_id)
+        postings.append(slot)
+    return postings
+
+def iter_pairs(postings):
+    it = iter(postings)
+    return zip(it, it)
+
+# ---------------------
+# In-memory index
+# ---------------------
+class InvertedIndex:
+    """색인 중에 쓰는 메모리 색인.
+
+    경로는 doc id로 바꿔 두고, 단어마다 array('I') 에 doc id, slot 을 번갈아 붙인다.
+    문서는 doc id 순서로, 한 문서 안에서는 줄 순서로 들어오므로 postings는 항상 정렬되어 있다.
+    삭제된 문서는 docs 에서 None 으로만 표시하고 write_index 에서 걸러낸다.
+    records 는 doc id별 본문 레코드 오프셋 (line_store), lengths 는 문서의 단어 수.
+    """
+
+    def __init__(self):
+        self.docs = []
+        self.records = []
+        self.lengths = []
+        self.doc_ids = {}
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.postings)
+
+    def add_document(self, path, title_words, line_words, record=NO_RECORD):
+        path = str(path)
+        if path in self.doc_ids:
+            self.remove_documents([path])
+        doc_id = len(self.docs)
+        self.docs.append(path)
+        self.records.append(record)
+        self.lengths.append(len(title_words) + sum(len(words) for words in line_words))
+        self.doc_ids[path] = doc_id
+        self._add_line(doc_id, 0, title_words)
+        for slot, words in enumerate(line_words, 1):
+            self._add_line(doc_id, slot, words)
+        return doc_id
+
+    def _add_line(self, doc_id, slot, words):
+        # 같은 줄에 같은 단어가 여러 번 나와도 posting은 하나
+        for word in set(words):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = array('I')
+            postings.append(doc_id)
+            postings.append(slot)
+
+    def remove_documents(self, paths):
+        for path in paths:
+            doc_id = self.doc_ids.pop(str(path), None)
+            if doc_id is not None:
+                self.docs[doc_id] = None
+                self.records[doc_id] = NO_RECORD
+
+    def get(self, term, default=None):
+        postings = self.postings.get(term)
+        if postings is None:
+            return default
+        return [(Path(self.docs[doc_id]), slot - 1)
+                for doc_id, slot in iter_pairs(postings) if self.docs[doc_id] is not None]
+
+    def items(self):
+        return ((term, self.get(term)) for term in self.postings)
+
+    @classmethod
+    def from_dict(cls, legacy):
+        """예전 {단어: [(Path, 줄 번호), ...]} 색인을 옮긴다."""
+        index = cls()
+        index.docs = sorted({str(doc) for postings in legacy.values() for doc, _ in postings})
+        index.records = [NO_RECORD] * len(index.docs)
+        index.lengths = [0] * len(index.docs)
+        index.doc_ids = {path: doc_id for doc_id, path in enumerate(index.docs)}
+        for term, postings in legacy.items():
+            pairs = sorted({(index.doc_ids[str(doc)], line + 1) for doc, line in postings})
+            if pairs:
+                index.postings[term] = array('I', [v for pair in pairs for v in pair])
+            for doc, _ in postings:
+                index.lengths[index.doc_ids[str(doc)]] += 1
+        return index
+
+# ---------------------
+# Writer
+# ---------------------
+def write_index(path, index, ngrams=True):
+    """InvertedIndex 를 바이너리 색인 파일로 저장한다. 삭제된 doc id는 여기서 채워진다.
+
+    ngrams 가 True면 단어 목록의 글자 n-gram 색인도 같이 만든다.
+    """
+    remap = {}
+    doc_paths = []
+    doc_blob = bytearray()
+    doc_entries = []
+    total_length = 0
+    for doc_id, doc in enumerate(index.docs):
+        if doc is not None:
+            remap[doc_id] = len(doc_paths)
+            doc_paths.append(doc)
+            doc_entries.append((len(doc_blob), index.records[doc_id], index.lengths[doc_id]))
+            doc_blob += doc.encode('utf-8')
+            total_length += index.lengths[doc_id]
+    doc_entries.append((len(doc_blob), NO_RECORD, 0))
+
+    term_blob = bytearray()
+    postings_blob = bytearray()
+    term_entries = []
+    gram_terms = {}
+    for encoded, term in sorted((term.encode('utf-8'), term) for term in index.postings):
+        pairs = [(remap[doc_id], slot) for doc_id, slot in iter_pairs(index.postings[term])
+                 if doc_id in remap]
+        if not pairs:
+            continue
+        if ngrams:
+            for gram in char_ngrams(term):
+                gram_terms.setdefault(gram, []).append(len(term_entries))
+        term_entries.append((len(term_blob), len(postings_blob)))
+        term_blob += encoded
+        encode_postings(pairs, postings_blob)
+    term_count = len(term_entries)
+    term_entries.append((len(term_blob), len(postings_blob)))
+
+    gram_blob = bytearray()
+    gram_postings_blob = bytearray()
+    gram_entries = []
+    for encoded, gram in sorted((gram.encode('utf-8'), gram) for gram in gram_terms):
+        gram_entries.append((len(gram_blob), len(gram_postings_blob)))
+        gram_blob += encoded
+        encode_ids(gram_terms[gram], gram_postings_blob)
+    gram_count = len(gram_entries)
+    gram_entries.append((len(gram_blob), len(gram_postings_blob)))
+
+    doc_table_off = HEADER.size
+    doc_blob_off = doc_table_off + DOC_ENTRY.size * len(doc_entries)
+    term_table_off = doc_blob_off + len(doc_blob)
+    term_blob_off = term_table_off + PAIR.size * len(term_entries)
+    postings_off = term_blob_off + len(term_blob)
+    gram_table_off = postings_off + len(postings_blob)
+    gram_blob_off = gram_table_off + PAIR.size * len(gram_entries)
+    gram_postings_off = gram_blob_off + len(gram_blob)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(doc_paths), term_count, gram_count, 0,
+                            doc_table_off, term_table_off, term_blob_off, postings_off,
+                            gram_table_off, gram_blob_off, gram_postings_off, total_length))
+        f.write(b''.join(DOC_ENTRY.pack(*entry) for entry in doc_entries))
+        f.write(doc_blob)
+        f.write(b''.join(PAIR.pack(*entry) for entry in term_entries))
+        f.write(term_blob)
+        f.write(postings_blob)
+        f.write(b''.join(PAIR.pack(*entry) for entry in gram_entries))
+        f.write(gram_blob)
+        f.write(gram_postings_blob)
+    os.replace(tmp_path, path)
+
+# ---------------------
+# Reader
+# ---------------------
+class MappedIndex:
+    """mmap으로 연 색인. dict처럼 get/in/items 를 지원하며 찾는 단어의 페이지만 읽는다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.doc_count, self.term_count, self.gram_count, _,
+         self._doc_table, self._term_table, self._term_blob, self._postings,
+         self._gram_table, self._gram_blob, self._gram_postings,
+         self.total_length) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'{path}: 지원하지 않는 색인 형식입니다')
+        self._doc_blob = self._doc_table + DOC_ENTRY.size * (self.doc_count + 1)
+        self.avg_doc_length = self.total_length / self.doc_count if self.doc_count else 0.0
+        self._doc_cache = {}
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.term_count
+
+    def doc_path(self, doc_id):
+        path = self._doc_cache.get(doc_id)
+        if path is None:
+            start, _, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * doc_id)
+            end, _, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * (doc_id + 1))
+            path = Path(self._mm[self._doc_blob + start:self._doc_blob + end].decode('utf-8'))
+            self._doc_cache[doc_id] = path
+        return path
+
+    def doc_record(self, doc_id):
+        _, record, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * doc_id)
+        return record
+
+    def doc_length(self, doc_id):
+        _, _, length = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * doc_id)
+        return length
+
+    def _entry(self, table, i):
+        key_off, data_off = PAIR.unpack_from(self._mm, table + PAIR.size * i)
+        next_key_off, _ = PAIR.unpack_from(self._mm, table + PAIR.size * (i + 1))
+        return key_off, next_key_off, data_off
+
+    def _term_entry(self, i):
+        return self._entry(self._term_table, i)
+
+    def _term_bytes(self, i):
+        start, end, _ = self._term_entry(i)
+        return self._mm[self._term_blob + start:self._term_blob + end]
+
+    def _gram_bytes(self, i):
+        start, end, _ = self._entry(self._gram_table, i)
+        return self._mm[self._gram_blob + start:self._gram_blob + end]
+
+    @staticmethod
+    def _lower_bound(key_at, count, key):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_term(self, term):
+        """단어의 순번을 이진 탐색으로 찾는다. 없으면 -1."""
+        key = term.encode('utf-8')
+        lo = self._lower_bound(self._term_bytes, self.term_count, key)
+        if lo < self.term_count and self._term_bytes(lo) == key:
+            return lo
+        return -1
+
+    def prefix_terms(self, prefix, limit=None):
+        """prefix로 시작하는 단어 순번들. 단어 표가 정렬되어 있으므로 범위만 읽는다."""
+        key = prefix.encode('utf-8')
+        i = self._lower_bound(self._term_bytes, self.term_count, key)
+        found = []
+        while i < self.term_count and self._term_bytes(i).startswith(key):
+            found.append(i)
+            if limit is not None and len(found) >= limit:
+                break
+            i += 1
+        return found
+
+    def _gram_terms(self, gram):
+        key = gram.encode('utf-8')
+        i = self._lower_bound(self._gram_bytes, self.gram_count, key)
+        if i >= self.gram_count or self._gram_bytes(i) != key:
+            return None
+        _, _, data_off = self._entry(self._gram_table, i)
+        return decode_ids(self._mm, self._gram_postings + data_off)
+
+    def substring_terms(self, text, limit=None):
+        """text를 포함하는 단어 순번들.
+
+        text의 n-gram 목록을 짧은 것부터 교집합한 뒤 실제 단어로 확인한다.
+        text가 n-gram보다 짧거나 n-gram 색인이 없으면 빈 목록.
+        """
+        grams = char_ngrams(text)
+        if not grams or not self.gram_count:
+            return []
+        lists = []
+        for gram in grams:
+            ids = self._gram_terms(gram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return []
+        found = []
+        for i in sorted(candidates):
+            if text in self.term(i):
+                found.append(i)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def prefix_words(self, prefix, limit=None):
+        return [self.term(i) for i in self.prefix_terms(prefix, limit)]
+
+    def substring_words(self, text, limit=None):
+        return [self.term(i) for i in self.substring_terms(text, limit)]
+
+    def term(self, i):
+        return self._term_bytes(i).decode('utf-8')
+
+    def raw_postings(self, i):
+        _, _, postings_off = self._term_entry(i)
+        return decode_postings(self._mm, self._postings + postings_off)
+
+    def postings(self, i):
+        return [(self.doc_path(doc_id), slot - 1) for doc_id, slot in iter_pairs(self.raw_postings(i))]
+
+    def get(self, term, default=None):
+        i = self.find_term(term)
+        return self.postings(i) if i >= 0 else default
+
+    def term_postings(self, term):
+        i = self.find_term(term)
+        if i < 0:
+            return None
+        return self.postings_at(i)
+
+    def postings_at(self, i):
+        _, _, postings_off = self._term_entry(i)
+        return TermPostings(self._mm, self._postings + postings_off)
+
+    def __contains__(self, term):
+        return self.find_term(term) >= 0
+
+    def __getitem__(self, term):
+        i = self.find_term(term)
+        if i < 0:
+            raise KeyError(term)
+        return self.postings(i)
+
+    def keys(self):
+        return (self.term(i) for i in range(self.term_count))
+
+    __iter__ = keys
+
+    def items(self):
+        return ((self.term(i), self.postings(i)) for i in range(self.term_count))
+
+# ---------------------
+# Legacy pickle converter
+# ---------------------
+def convert_pickle_index(pickle_path, out_path, line_map_path=None, line_store_path=None):
+    """doc_index.pkl (+ line_map.pkl) 을 새 색인 파일 (+ 본문 저장소) 로 옮긴다."""
+    with open(pickle_path, 'rb') as f:
+        index = InvertedIndex.from_dict(pickle.load(f))
+    if line_map_path and line_store_path and os.path.exists(line_map_path):
+        with open(line_map_path, 'rb') as f:
+            line_map = pickle.load(f)
+        with LineStoreWriter(line_store_path) as writer:
+            for file, lines in line_map.items():
+                doc_id = index.doc_ids.get(str(file))
+                if doc_id is not None and lines:
+                    index.records[doc_id] = writer.add([lines.get(i, '') for i in range(max(lines) + 1)])
+    write_index(out_path, index)
+    return len(index)
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 5):
+        print('사용법: python index_format.py doc_index.pkl doc_index.bin [line_map.pkl doc_lines.dat]')
+        sys.exit(1)
+    count = convert_pickle_index(*sys.argv[1:])
+    print(f'{count}개 단어 변환 완료: {sys.argv[2]}')
@@ -0,0 +1,330 @@
+# inverted_store.py
+# 역색인 검색 앱(app2.py)의 문서/역색인 저장소
+#
+# 문서를 추가/수정/삭제할 때마다 전체 JSON을 다시 쓰지 않고 바뀐 문서만 로그 끝에 붙인다.
+#   inverted_index.json : 스냅샷 {'version', 'seq': 마지막으로 반영한 로그 번호,
+#                         'documents': {id: 본문}, 'index': {단어: [[id, 나온 횟수], ...]}}
+#   index_log.jsonl     : 스냅샷 이후의 변경, 한 줄에 하나
+#                         {'seq', 'op': 'put', 'id', 'text'} 또는 {'seq', 'op': 'delete', 'id'}
+#   fuzzy_index.json    : 스냅샷 시점의 오타 교정 색인 (fuzzy_index.py)
+#   inverted_index.bin  : 스냅샷을 컴파일한 읽기 전용 공유 색인 (shared_index.py)
+# 시작할 때 스냅샷을 읽고 seq가 더 큰 로그만 다시 적용한다. 로그가 SNAPSHOT_OPS 건 쌓이면
+# 백그라운드에서 새 스냅샷을 쓰고 스냅샷에 들어간 로그 앞부분을 잘라낸다.
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from fuzzy_index import FuzzyIndex, closest
+from shared_index import write_shared_index
+
+LOG_FILE = 'index_log.jsonl'
+FUZZY_FILE = 'fuzzy_index.json'
+SHARED_FILE = 'inverted_index.bin'
+SNAPSHOT_OPS = 10000  # 로그에 이만큼 쌓이면 스냅샷을 새로 쓴다
+SNAPSHOT_VERSION = 2
+MAX_DOC_ID = 2 ** 63 - 1
+
+def tokenize(content):
+    # 소문자로 변환하고 구두점 제거
+    words = (word.lower().strip('.,!?') for word in content.split())
+    return [word for word in words if word]
+
+def write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def check_id(doc_id):
+    if not isinstance(doc_id, int) or isinstance(doc_id, bool):
+        raise ValueError(f'문서 ID는 정수여야 합니다: {doc_id!r}')
+    # 공유 색인 (shared_index.py) 은 문서 ID를 부호 없는 varint와 u64로 쓴다
+    if not 0 <= doc_id <= MAX_DOC_ID:
+        raise ValueError(f'문서 ID는 0 이상 {MAX_DOC_ID} 이하여야 합니다: {doc_id}')
+
+def check_entry(entry):
+    if not isinstance(entry, dict) or not isinstance(entry.get('text'), str):
+        raise ValueError('문서마다 text 문자열이 필요합니다')
+    if 'id' in entry:
+        check_id(entry['id'])
+
+class InvertedStore:
+    """문서, 역색인, 오타 교정 색인을 함께 들고 변경을 로그에 남긴다.
+
+    add/update/delete 는 묶음 단위로 먼저 전부 확인하고, 로그에 쓴 다음 메모리에 반영한다.
+    검색은 view() 안에서 읽는다 (postings set을 읽는 중에 다른 스레드가 고치지 않게).
+    """
+    read_only = False
+
+    def __init__(self, index_file, seed_documents=None, snapshot_ops=SNAPSHOT_OPS):
+        directory = os.path.dirname(index_file)
+        self.index_file = index_file
+        self.log_file = os.path.join(directory, LOG_FILE)
+        self.fuzzy_file = os.path.join(directory, FUZZY_FILE)
+        self.shared_file = os.path.join(directory, SHARED_FILE)
+        self.snapshot_ops = snapshot_ops
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.inverted_index = {}  # 단어 -> {문서 ID: 그 문서에 나온 횟수}
+        self.doc_lengths = {}  # 문서 ID -> 단어 수 (BM25 문서 길이)
+        self.total_length = 0
+        self.fuzzy_index = None
+        self.seq = 0
+        self.logged = 0  # 마지막 스냅샷 뒤로 로그에 쌓인 변경 수
+        self._snapshot_thread = None
+        self._load(seed_documents or {})
+
+    # ---------------------
+    # Loading
+    # ---------------------
+    def _load(self, seed_documents):
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == SNAPSHOT_VERSION:
+                self.seq = data['seq']
+                self.documents = {int(doc_id): text for doc_id, text in data['documents'].items()}
+                # JSON은 [id, 횟수] 리스트로 저장하므로 dict로 변환하고 문서 길이를 다시 센다
+                for word, pairs in data['index'].items():
+                    self.inverted_index[word] = dict(pairs)
+                    for doc_id, count in pairs:
+                        self.doc_lengths[doc_id] = self.doc_lengths.get(doc_id, 0) + count
+                self.total_length = sum(self.doc_lengths.values())
+            else:
+                # 예전 형식은 단어마다 문서 ID만 있으므로 본문에서 색인을 다시 만든다.
+                # 단어 -> 문서 ID 목록만 저장한 파일이면 본문은 예시 문서를 쓴다.
+                documents = seed_documents
+                if isinstance(data.get('seq'), int) and isinstance(data.get('documents'), dict):
+                    self.seq = data['seq']
+                    documents = {int(doc_id): text for doc_id, text in data['documents'].items()}
+                for doc_id, text in documents.items():
+                    self._put(doc_id, text)
+                write_json(self.index_file, self._snapshot_data())
+        else:
+            for doc_id, text in seed_documents.items():
+                self._put(doc_id, text)
+            write_json(self.index_file, self._snapshot_data())
+
+        # 오타 교정 색인 로드 또는 생성 (스냅샷보다 오래된 파일은 다시 만든다)
+        if (os.path.exists(self.fuzzy_file)
+                and os.path.getmtime(self.fuzzy_file) >= os.path.getmtime(self.index_file)):
+            self.fuzzy_index = FuzzyIndex.load(self.fuzzy_file)
+        else:
+            self.fuzzy_index = FuzzyIndex.build(self.inverted_index)
+            self.fuzzy_index.save(self.fuzzy_file)
+        if (not os.path.exists(self.shared_file)
+                or os.path.getmtime(self.shared_file) < os.path.getmtime(self.index_file)):
+            write_shared_index(self.shared_file, self._snapshot_data(), self.fuzzy_index)
+        self._replay_log()
+        self._log = open(self.log_file, 'ab')
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_file):
+            return
+        good = 0
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # 쓰다가 끊긴 마지막 줄
+                good += len(line)
+                if record['seq'] > self.seq:
+                    self._apply(record)
+                    self.seq = record['seq']
+                    self.logged += 1
+        if good < os.path.getsize(self.log_file):
+            os.truncate(self.log_file, good)
+
+    # ---------------------
+    # Reading
+    # ---------------------
+    @contextmanager
+    def view(self):
+        with self.lock:
+            yield self
+
+    @property
+    def doc_count(self):
+        return len(self.documents)
+
+    @property
+    def avg_doc_length(self):
+        return self.total_length / len(self.documents) if self.documents else 0.0
+
+    def postings(self, word):
+        """{문서 ID: 나온 횟수}. 없는 단어면 None."""
+        return self.inverted_index.get(word)
+
+    def doc_length(self, doc_id):
+        return self.doc_lengths.get(doc_id, 0)
+
+    def correct(self, word):
+        """색인에 없는 단어 대신 찾을 가장 가까운 단어. 없으면 None."""
+        return closest(self.fuzzy_index.suggest(word), lambda w: len(self.inverted_index[w]))
+
+    def document(self, doc_id):
+        return self.documents.get(doc_id)
+
+    # ---------------------
+    # Batch Updates
+    # ---------------------
+    def add(self, entries):
+        """[{'id'(없으면 새 번호), 'text'}, ...] 를 추가하고 문서 ID 목록을 돌려준다."""
+        for entry in entries:
+            check_entry(entry)
+        with self.lock:
+            given = [entry['id'] for entry in entries if 'id' in entry]
+            existing = sorted(set(given) & self.documents.keys())
+            if existing:
+                raise ValueError(f'이미 있는 문서입니다: {existing}')
+            if len(set(given)) < len(given):
+                raise ValueError('같은 문서 ID가 두 번 들어 있습니다')
+            next_id = max([0, *self.documents, *given]) + 1
+            records = []
+            for entry in entries:
+                doc_id = entry.get('id')
+                if doc_id is None:
+                    doc_id = next_id
+                    next_id += 1
+                    check_id(doc_id)
+                records.append({'op': 'put', 'id': doc_id, 'text': entry['text']})
+            self._commit(records)
+        return [record['id'] for record in records]
+
+    def update(self, entries):
+        """[{'id', 'text'}, ...] 로 본문을 바꾼다. 없는 문서가 있으면 KeyError(ID 목록)."""
+        for entry in entries:
+            check_entry(entry)
+            if 'id' not in entry:
+                raise ValueError('수정할 문서마다 id가 필요합니다')
+        with self.lock:
+            self._check_exists([entry['id'] for entry in entries])
+            records = [{'op': 'put', 'id': entry['id'], 'text': entry['text']} for entry in entries]
+            self._commit(records)
+        return [record['id'] for record in records]
+
+    def delete(self, ids):
+        for doc_id in ids:
+            check_id(doc_id)
+        with self.lock:
+            self._check_exists(ids)
+            records = [{'op': 'delete', 'id': doc_id} for doc_id in dict.fromkeys(ids)]
+            self._commit(records)
+        return [record['id'] for record in records]
+
+    def _check_exists(self, ids):
+        missing = sorted(set(ids) - self.documents.keys())
+        if missing:
+            raise KeyError(missing)
+
+    def _commit(self, records):
+        # 로그에 먼저 쓰고 (fsync) 메모리에 반영한다
+        records = [{'seq': seq, **record} for seq, record in enumerate(records, self.seq + 1)]
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self._log.write(data.encode('utf-8'))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        for record in records:
+            self._apply(record)
+        self.seq += len(records)
+        self.logged += len(records)
+        if self.logged >= self.snapshot_ops:
+            self._start_snapshot()
+
+    def _apply(self, record):
+        if record['op'] == 'put':
+            self._put(record['id'], record['text'])
+        elif record['id'] in self.documents:
+            doc_id = record['id']
+            self._unpost(doc_id, set(tokenize(self.documents.pop(doc_id))))
+            self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def _put(self, doc_id, text):
+        # 예전 본문과 새 본문의 단어 차이 (나온 횟수가 바뀐 단어 포함) 만 postings에 반영한다
+        old = self.documents.get(doc_id)
+        old_counts = Counter(tokenize(old)) if old is not None else Counter()
+        new_counts = Counter(tokenize(text))
+        self.documents[doc_id] = text
+        self._unpost(doc_id, old_counts.keys() - new_counts.keys())
+        for word, count in new_counts.items():
+            if old_counts.get(word) == count:
+                continue
+            postings = self.inverted_index.get(word)
+            if postings is None:
+                self.inverted_index[word] = {doc_id: count}
+                if self.fuzzy_index is not None:
+                    self.fuzzy_index.add(word)
+            else:
+                postings[doc_id] = count
+        length = sum(new_counts.values())
+        self.total_length += length - self.doc_lengths.get(doc_id, 0)
+        self.doc_lengths[doc_id] = length
+
+    def _unpost(self, doc_id, words):
+        for word in words:
+            postings = self.inverted_index[word]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.inverted_index[word]
+                if self.fuzzy_index is not None:
+                    self.fuzzy_index.remove(word)
+
+    # ---------------------
+    # Snapshots
+    # ---------------------
+    def _snapshot_data(self):
+        return {'version': SNAPSHOT_VERSION, 'seq': self.seq, 'documents': dict(self.documents),
+                'index': {word: sorted(postings.items())
+                          for word, postings in self.inverted_index.items()}}
+
+    def _start_snapshot(self):
+        # lock 안에서 호출한다. 메모리 사본만 만들고 파일 쓰기는 백그라운드 스레드에서 한다.
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return None
+        data = self._snapshot_data()
+        self.logged = 0
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(data, self._log.tell()))
+        self._snapshot_thread.start()
+        return self._snapshot_thread
+
+    def snapshot(self):
+        """지금 상태로 스냅샷을 쓰고 끝날 때까지 기다린다."""
+        while True:
+            with self.lock:
+                thread = self._start_snapshot()
+                running = self._snapshot_thread
+            if thread is not None:
+                thread.join()
+                return
+            running.join()
+
+    def _write_snapshot(self, data, log_offset):
+        write_json(self.index_file, data)
+        fuzzy = FuzzyIndex.build(data['index'])
+        fuzzy.save(self.fuzzy_file)
+        # 워커들이 여는 공유 색인은 다 쓴 다음 한 번에 바꾼다
+        write_shared_index(self.shared_file, data, fuzzy)
+        with self.lock:
+            # 스냅샷에 들어간 로그 앞부분을 버리고, 그 사이에 붙은 뒷부분만 남긴다
+            self._log.close()
+            with open(self.log_file, 'rb') as f:
+                f.seek(log_offset)
+                tail = f.read()
+            tmp_path = f'{self.log_file}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_file)
+            self._log = open(self.log_file, 'ab')
+
+    def close(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self.lock:
+            self._log.close()
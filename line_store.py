@@ -0,0 +1,127 @@
+# line_store.py
+# 문서 검색 앱의 본문 저장소 (line_map.pkl 대신 필요한 줄만 디스크에서 읽는다)
+#
+# 문서 하나가 레코드 하나이며 파일 끝에 이어 붙인다.
+#   record : u32 줄 수 n, u32 페이지 수 p, (n+1) 개의 u32 줄 시작 오프셋,
+#            p 개의 u32 페이지 첫 줄 번호 (PDF만), utf-8 본문
+# 색인 파일의 doc 표에 문서마다 레코드 오프셋이 들어 있다.
+import os
+import mmap
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+U32 = struct.Struct('<I')
+RECORD_HEADER = struct.Struct('<II')
+NO_RECORD = 2 ** 64 - 1
+CACHE_SIZE = 64  # 줄 오프셋 표를 캐시해 둘 최근 문서 수
+
+class LineStoreWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+        self.size = self._file.tell()
+
+    def add(self, lines, pages=()):
+        """줄 목록을 레코드로 붙이고 레코드 오프셋을 돌려준다. pages는 페이지마다 첫 줄 번호."""
+        encoded = [line.encode('utf-8') for line in lines]
+        offsets = array('I', [0])
+        for line in encoded:
+            offsets.append(offsets[-1] + len(line))
+        pages = array('I', pages)
+        record = self.size
+        data = (RECORD_HEADER.pack(len(encoded), len(pages)) + offsets.tobytes() + pages.tobytes()
+                + b''.join(encoded))
+        self._file.write(data)
+        self.size += len(data)
+        return record
+
+    def add_record(self, data):
+        """다른 저장소에서 record_bytes 로 읽은 레코드를 그대로 붙인다."""
+        record = self.size
+        self._file.write(data)
+        self.size += len(data)
+        return record
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class LineStore:
+    """mmap으로 연 본문 저장소. 최근에 본 문서의 줄 오프셋 표만 LRU로 들고 있는다."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()  # 검색 스레드와 GUI가 같이 읽는다
+
+    def close(self):
+        if self._file is not None:
+            if self.size:
+                self._mm.close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _offsets(self, record):
+        with self._lock:
+            offsets = self._cache.get(record)
+            if offsets is not None:
+                self._cache.move_to_end(record)
+                return offsets
+        count, page_count = RECORD_HEADER.unpack_from(self._mm, record)
+        start = record + RECORD_HEADER.size
+        offsets = array('I')
+        offsets.frombytes(self._mm[start:start + U32.size * (count + 1)])
+        start += U32.size * (count + 1)
+        pages = array('I')
+        pages.frombytes(self._mm[start:start + U32.size * page_count])
+        text_start = start + U32.size * page_count
+        offsets = (text_start, offsets, pages)
+        with self._lock:
+            self._cache[record] = offsets
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return offsets
+
+    def line(self, record, i):
+        if record == NO_RECORD or record >= self.size:
+            return ''
+        text_start, offsets, _ = self._offsets(record)
+        if not 0 <= i < len(offsets) - 1:
+            return ''
+        return self._mm[text_start + offsets[i]:text_start + offsets[i + 1]].decode('utf-8')
+
+    def page_of(self, record, i):
+        """PDF 문서의 i번째 줄이 몇 페이지 몇 번째 줄인지 (1부터). 페이지 정보가 없으면 None."""
+        if record == NO_RECORD or record >= self.size:
+            return None
+        _, _, pages = self._offsets(record)
+        if not pages:
+            return None
+        page = bisect_right(pages, i) - 1
+        return page + 1, i - pages[page] + 1
+
+    def record_size(self, record):
+        if record == NO_RECORD or record >= self.size:
+            return 0
+        text_start, offsets, _ = self._offsets(record)
+        return text_start - record + offsets[-1]
+
+    def record_bytes(self, record):
+        return self._mm[record:record + self.record_size(record)]
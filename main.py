@@ -1,97 +1,153 @@
 # doc_search_app.py
 # pyinstaller --onefile --windowed doc_search_app.py
+#
+# 색인/검색은 doc_search_core.py 에 있고 여기는 화면만 다룬다.
+# 검색 데몬 (python doc_search_cli.py serve) 이 떠 있으면 검색과 색인을 데몬에 맡긴다.
 import sys
 import os
-import pickle
 import subprocess
+import multiprocessing
 from pathlib import Path
-from collections import defaultdict
-import regex
-import docx, pptx, openpyxl
-import PyPDF2
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QFileDialog,
-    QTextEdit, QVBoxLayout, QLineEdit, QLabel, QProgressDialog, QListWidget, QListWidgetItem
+    QTextEdit, QVBoxLayout, QLineEdit, QLabel, QProgressDialog, QListView, QCheckBox
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import (
+    Qt, QThread, QTimer, pyqtSignal, QAbstractListModel, QModelIndex, QFileSystemWatcher
+)
+from segments import plan_merge, merge_segments
+from doc_query import QueryCancelled
+from doc_search_core import (
+    DocSearch, Indexer, find_office_files, SEGMENT_DIR, NGRAM_INDEX, EXTRACT_REPORT_FILE)
+from doc_search_daemon import DaemonClient
 
-INDEX_FILE = 'doc_index.pkl'
-LINE_MAP_FILE = 'line_map.pkl'
+SEARCH_DEBOUNCE_MS = 250  # 타이핑이 멈추고 이만큼 지나면 검색
+WATCH_BATCH_MS = 2000  # 폴더 변경 알림을 이만큼 모아서 한 번에 반영
+DAEMON_URL = os.environ.get('DOC_SEARCH_URL', 'http://127.0.0.1:8765')
 
 # ---------------------
-# Text Extraction Logic
+# Indexing Worker Thread
 # ---------------------
-def extract_text(path):
-    try:
-        suffix = Path(path).suffix.lower()
-        if suffix == '.docx':
-            doc = docx.Document(path)
-            return '\n'.join(p.text for p in doc.paragraphs)
-
-        elif suffix == '.pptx':
-            prs = pptx.Presentation(path)
-            text = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text.append(shape.text)
-            return '\n'.join(text)
-
-        elif suffix == '.xlsx':
-            wb = openpyxl.load_workbook(path, data_only=True)
-            text = []
-            for sheet in wb:
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = [str(cell) for cell in row if cell]
-                    text.append(' '.join(row_text))
-            return '\n'.join(text)
+class IndexWorker(QThread):
+    progress = pyqtSignal(int, int, float)  # 확인한 파일 수, 추출한 파일 수, 초당 확인 파일 수
+    finished = pyqtSignal(object, dict, int, int, object)  # state, manifest, 파일 수, 추출 수, profile
 
-        else:
-            return ''
-    except Exception as e:
-        return ''
+    def __init__(self, files=None, state=None, manifest=None, processes=None, scope=None, folder=None):
+        super().__init__()
+        self.indexer = Indexer(files, state, manifest, processes, scope, folder, progress=self.progress.emit)
+
+    def run(self):
+        self.finished.emit(*self.indexer.run(), self.indexer.profile)
 
 # ---------------------
-# File Finder
+# Segment Merge Thread
 # ---------------------
-def find_office_files(directory):
-    exts = ['*.pptx', '*.docx', '*.xlsx', '*.pdf']
-    results = []
-    for ext in exts:
-        results.extend(Path(directory).rglob(ext))
-    return results
+class MergeWorker(QThread):
+    """작은 세그먼트를 합치고 삭제된 문서를 버린다. 색인 작업과 번갈아 self.worker 자리에서 돈다."""
+    finished = pyqtSignal(object, dict)
+
+    def __init__(self, state, names):
+        super().__init__()
+        self.state = state
+        self.names = names
+
+    def run(self):
+        state, remap = merge_segments(SEGMENT_DIR, self.state, self.names, ngrams=NGRAM_INDEX)
+        self.finished.emit(state, remap)
 
 # ---------------------
-# Indexing Worker Thread
+# Query Worker Thread
 # ---------------------
-class IndexWorker(QThread):
-    progress = pyqtSignal(int)
-    finished = pyqtSignal(dict, dict, int)
+class QueryWorker(QThread):
+    done = pyqtSignal(int, str, object)
 
-    def __init__(self, files):
+    def __init__(self, search, query, generation):
         super().__init__()
-        self.files = files
+        self.search = search  # 검색어 -> 결과 목록 (DocSearch.search 또는 DaemonClient.search)
+        self.query = query
+        self.generation = generation
 
     def run(self):
-        index = defaultdict(list)
-        line_map = defaultdict(dict)
-        total = len(self.files)
-        for idx, file in enumerate(self.files):
-            suffix = Path(file).suffix.lower()
-            title = Path(file).stem.lower()
-            for word in regex.findall(r'\p{L}+', title):
-                index[word.lower()].append((file, -1))
-
-            if suffix != '.pdf':
-                content = extract_text(file)
-                lines = content.split('\n')
-                for i, line in enumerate(lines):
-                    for word in regex.findall(r'\p{L}+', line):
-                        index[word.lower()].append((file, i))
-                    line_map[file][i] = line
-
-            self.progress.emit(int((idx + 1) / total * 100))
-        self.finished.emit(index, line_map, total)
+        try:
+            results = self.search(self.query)
+        except QueryCancelled:
+            return
+        except OSError:
+            results = None  # 데몬 연결 실패
+        self.done.emit(self.generation, self.query, results)
+
+# ---------------------
+# Search Result Model
+# ---------------------
+class SearchResultModel(QAbstractListModel):
+    """문서 단위 검색 결과. fetchMore로 PAGE_SIZE 줄씩만 보여주고, 글자는 화면에 그릴 때 만든다.
+
+    데몬 검색은 첫 PAGE_SIZE 개만 받아 오고, 다음 페이지는 fetchMore 에서 fetch(offset) 로 받는다.
+    """
+    PAGE_SIZE = 100
+
+    def __init__(self, describe, parent=None):
+        super().__init__(parent)
+        self.describe = describe  # result -> (표시 문자열, 파일 경로)
+        self.results = []
+        self.loaded = 0
+        self.fetch = None
+        self.message = None
+        self._rows = {}
+
+    def set_results(self, results, fetch=None):
+        self.beginResetModel()
+        self.results = list(results)
+        self.loaded = min(self.PAGE_SIZE, len(results))
+        self.fetch = fetch if len(results) >= self.PAGE_SIZE else None  # 덜 왔으면 끝까지 받은 것
+        self.message = None
+        self._rows = {}
+        self.endResetModel()
+
+    def set_message(self, message):
+        self.beginResetModel()
+        self.results = []
+        self.loaded = 0
+        self.fetch = None
+        self.message = message
+        self._rows = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 1 if self.message is not None else self.loaded
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self.message is not None:
+            return self.message if role == Qt.DisplayRole else None
+        if role not in (Qt.DisplayRole, Qt.UserRole):
+            return None
+        row = self._rows.get(index.row())
+        if row is None:
+            row = self._rows[index.row()] = self.describe(self.results[index.row()])
+        return row[0] if role == Qt.DisplayRole else row[1]
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self.loaded < len(self.results) or self.fetch is not None)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.loaded == len(self.results) and self.fetch is not None:
+            try:
+                page = self.fetch(len(self.results))
+            except OSError:
+                page = []  # 데몬 연결이 끊기면 받은 데까지만 보여준다
+            if len(page) < self.PAGE_SIZE:
+                self.fetch = None
+            self.results.extend(page)
+        count = min(self.PAGE_SIZE, len(self.results) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
 
 # ---------------------
 # GUI Class
@@ -99,8 +155,13 @@ class IndexWorker(QThread):
 class FileFinderApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.index = {}
-        self.line_map = {}
+        self.store = DocSearch()
+        self.client = DaemonClient.connect(DAEMON_URL)
+        self.query_generation = 0  # 검색을 새로 시작할 때마다 올려서 이전 검색을 취소
+        self.query_threads = set()
+        self.worker = None
+        self.progress = None
+        self.pending_dirs = set()
         self.initUI()
         self.load_index_from_file()
 
@@ -115,70 +176,222 @@ class FileFinderApp(QWidget):
         layout.addWidget(QLabel("검색어:"))
         layout.addWidget(self.searchBar)
 
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.searchTimer.timeout.connect(self.search)
+        self.searchBar.textChanged.connect(self.searchTimer.start)
+        self.searchBar.returnPressed.connect(self.search)
+
         self.searchBtn = QPushButton('검색 실행')
         self.searchBtn.clicked.connect(self.search)
         layout.addWidget(self.searchBtn)
 
-        self.resultList = QListWidget()
-        self.resultList.itemDoubleClicked.connect(self.open_file)
+        self.resultModel = SearchResultModel(self.describe_result, self)
+        self.resultList = QListView()
+        self.resultList.setUniformItemSizes(True)
+        self.resultList.setModel(self.resultModel)
+        self.resultList.doubleClicked.connect(self.open_file)
         layout.addWidget(self.resultList)
 
         self.folderBtn = QPushButton('폴더 선택 및 색인')
         self.folderBtn.clicked.connect(self.browse_folder)
         layout.addWidget(self.folderBtn)
 
+        self.watchBox = QCheckBox('폴더 변경 자동 반영')
+        self.watchBox.setChecked(self.client is None)
+        self.watchBox.setEnabled(self.client is None)  # 데몬을 쓰면 색인은 데몬 몫
+        self.watchBox.toggled.connect(self.set_watching)
+        layout.addWidget(self.watchBox)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.queue_directory)
+        self.watchTimer = QTimer(self)
+        self.watchTimer.setSingleShot(True)
+        self.watchTimer.setInterval(WATCH_BATCH_MS)
+        self.watchTimer.timeout.connect(self.apply_watch_batch)
+
         self.setLayout(layout)
 
     def browse_folder(self):
+        if self.worker is not None and self.worker.isRunning():
+            if isinstance(self.worker, MergeWorker):
+                self.resultModel.set_message("색인 정리 중입니다. 잠시 후 다시 시도하세요.")
+            return
         folder = QFileDialog.getExistingDirectory(self, '폴더 선택')
-        if folder:
-            files = find_office_files(folder)
+        if folder and self.client is not None:
+            try:
+                started = self.client.index(folder)
+            except OSError:
+                self.resultModel.set_message("검색 데몬에 연결할 수 없습니다.")
+                return
+            self.resultModel.set_message(
+                "데몬에서 색인을 시작했습니다." if started else "데몬이 이미 색인 중입니다.")
+        elif folder:
+            self.store.indexed_folder = Path(folder)
 
-            self.progress = QProgressDialog("색인 생성 중...", None, 0, 100, self)
+            self.progress = QProgressDialog("색인 생성 중...", None, 0, 0, self)
             self.progress.setWindowTitle("로딩 중")
             self.progress.setWindowModality(Qt.ApplicationModal)
             self.progress.setMinimumDuration(0)
             self.progress.show()
 
-            self.worker = IndexWorker(files)
-            self.worker.progress.connect(self.progress.setValue)
+            self.worker = IndexWorker(state=self.store.state, manifest=self.store.manifest, folder=folder)
+            self.worker.progress.connect(self.show_progress)
             self.worker.finished.connect(self.indexing_done)
             self.worker.start()
 
-    def indexing_done(self, index, line_map, count):
-        self.index = index
-        self.line_map = line_map
-        self.save_index_to_file()
-        self.resultList.clear()
-        self.resultList.addItem(f"색인 완료 및 저장: {count}개 파일")
-        self.progress.close()
+    def show_progress(self, checked, extracted, rate):
+        if self.progress is not None:
+            self.progress.setLabelText(
+                f"색인 생성 중... 확인 {checked}개, 새로 추출 {extracted}개 (초당 {rate:.1f}개)")
+
+    def indexing_done(self, state, manifest, count, changed, profile):
+        self.cancel_queries()
+        self.store.apply_index(state, manifest)
+        if self.progress is not None:
+            # 폴더를 직접 색인한 경우에만 느린/실패 파일 보고서를 남긴다
+            profile.write(EXTRACT_REPORT_FILE)
+            failed = f", 실패 {profile.failure_count}개 - {EXTRACT_REPORT_FILE} 참고" if profile.failure_count else ""
+            copies = f", 같은 내용 {profile.duplicates}개" if profile.duplicates else ""
+            self.resultModel.set_message(
+                f"색인 완료 및 저장: {count}개 파일 (새로 추출 {changed}개{copies}{failed})")
+            self.progress.close()
+            self.progress = None
+            self.set_watching(self.watchBox.isChecked())
+        self.refresh_results()
+        self.start_merge()
+
+    # ---------------------
+    # Segment Merging
+    # ---------------------
+    def start_merge(self):
+        # 합칠 세그먼트가 없으면 밀린 폴더 변경부터 반영한다
+        names = plan_merge(self.store.state)
+        if not names:
+            if self.pending_dirs:
+                self.watchTimer.start()
+            return
+        self.worker = MergeWorker(self.store.state, names)
+        self.worker.finished.connect(self.merge_done)
+        self.worker.start()
+
+    def merge_done(self, state, remap):
+        self.cancel_queries()
+        self.store.apply_merge(state, remap)
+        self.refresh_results()
+        self.start_merge()
+
+    def refresh_results(self):
+        # 색인을 바꾸면 doc id가 달라지므로 보여주던 결과는 버리고 새 색인으로 다시 검색한다
+        if self.resultModel.message is None:
+            self.resultModel.set_message("검색 중...")
+        if self.searchBar.text().strip():
+            self.search()
+
+    # ---------------------
+    # Folder Watching
+    # ---------------------
+    def set_watching(self, enabled):
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        folder = self.store.indexed_folder
+        if enabled and folder is not None and folder.is_dir():
+            self.watch_tree(folder)
+
+    def watch_tree(self, folder):
+        dirs = [str(folder)] + [str(p) for p in Path(folder).rglob('*') if p.is_dir()]
+        self.watcher.addPaths(dirs)
+
+    def queue_directory(self, path):
+        self.pending_dirs.add(path)
+        self.watchTimer.start()
+
+    def apply_watch_batch(self):
+        # 색인 중이면 끝난 뒤에 다시 시도 (indexing_done에서 타이머를 다시 건다)
+        if not self.pending_dirs or not self.store.manifest:
+            return
+        if self.worker is not None and self.worker.isRunning():
+            return
+        dirs, self.pending_dirs = self.pending_dirs, set()
+        watched = set(self.watcher.directories())
+        files, scope = [], []
+        for d in dirs:
+            folder = Path(d)
+            if not folder.is_dir():
+                scope.append((folder, True))  # 지워진 폴더: 그 아래 파일을 모두 뺀다
+                continue
+            scope.append((folder, False))
+            files.extend(find_office_files(folder, recursive=False))
+            for sub in folder.iterdir():
+                if sub.is_dir() and str(sub) not in watched:
+                    # 새로 생기거나 옮겨 온 폴더는 통째로 읽고 감시에 넣는다
+                    scope.append((sub, True))
+                    files.extend(find_office_files(sub))
+                    self.watch_tree(sub)
+
+        self.worker = IndexWorker(files, self.store.state, self.store.manifest, scope=scope)
+        self.worker.finished.connect(self.indexing_done)
+        self.worker.start()
 
     def search(self):
-        keyword = self.searchBar.text().strip().lower()
+        self.searchTimer.stop()
+        self.query_generation += 1
+        keyword = self.searchBar.text().strip()
         if not keyword:
-            self.resultList.clear()
-            self.resultList.addItem("검색어를 입력하세요.")
+            self.resultModel.set_message("검색어를 입력하세요.")
+            return
+        generation = self.query_generation
+        if self.client is not None:
+            search = lambda query: self.client.search(query, SearchResultModel.PAGE_SIZE)
+        elif self.store.index is None:
+            self.show_results([])
             return
+        else:
+            cached = self.store.cached(keyword)
+            if cached is not None:
+                self.show_results(cached)
+                return
+            cancelled = lambda: generation != self.query_generation
+            search = lambda query: self.store.search(query, cancelled)
+        worker = QueryWorker(search, keyword, generation)
+        worker.done.connect(self.query_done)
+        worker.finished.connect(lambda: self.query_threads.discard(worker))
+        self.query_threads.add(worker)
+        worker.start()
 
-        results = self.index.get(keyword, [])
-        self.resultList.clear()
-        if not results:
-            self.resultList.addItem("결과 없음")
+    def query_done(self, generation, keyword, results):
+        # 그 사이 새 검색이 시작됐거나 색인이 바뀌었으면 버린다
+        if generation != self.query_generation:
             return
+        if results is None:
+            self.resultModel.set_message("검색 데몬에 연결할 수 없습니다.")
+        elif self.client is not None:
+            client = self.client
+            self.show_results(results, lambda offset: client.search(keyword, SearchResultModel.PAGE_SIZE, offset))
+        else:
+            self.show_results(results)
 
-        for file, line_num in results:
-            if line_num == -1:
-                display = f"[제목 일치] {file}"
-            else:
-                line = self.line_map[file].get(line_num, '')
-                display = f"{file} (줄 {line_num+1}): {line}"
-            item = QListWidgetItem(display)
-            item.setData(Qt.UserRole, str(file))
-            self.resultList.addItem(item)
-
-    def open_file(self, item):
-        path = item.data(Qt.UserRole)
-        if os.path.exists(path):
+    def show_results(self, results, fetch=None):
+        if not results:
+            self.resultModel.set_message("결과 없음")
+        else:
+            self.resultModel.set_results(results, fetch)
+
+    def cancel_queries(self):
+        self.query_generation += 1
+        for worker in list(self.query_threads):
+            worker.wait()
+
+    def describe_result(self, result):
+        # 데몬 결과는 이미 글자로 만들어져 온다
+        if isinstance(result, dict):
+            return result['text'], result['path']
+        return self.store.describe(result)
+
+    def open_file(self, index):
+        path = index.data(Qt.UserRole)
+        if path and os.path.exists(path):
             try:
                 if sys.platform == "win32":
                     os.startfile(path)
@@ -189,20 +402,12 @@ class FileFinderApp(QWidget):
             except Exception as e:
                 print(f"파일 열기 실패: {e}")
 
-    def save_index_to_file(self):
-        with open(INDEX_FILE, 'wb') as f:
-            pickle.dump(self.index, f)
-        with open(LINE_MAP_FILE, 'wb') as f:
-            pickle.dump(self.line_map, f)
-
     def load_index_from_file(self):
-        if os.path.exists(INDEX_FILE) and os.path.exists(LINE_MAP_FILE):
-            with open(INDEX_FILE, 'rb') as f:
-                self.index = pickle.load(f)
-            with open(LINE_MAP_FILE, 'rb') as f:
-                self.line_map = pickle.load(f)
+        if self.client is None and self.store.load() and self.store.indexed_folder is not None:
+            self.set_watching(self.watchBox.isChecked())
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     ex = FileFinderApp()
     ex.show()
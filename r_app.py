@@ -1,16 +1,149 @@
 import sys
 import json
 import os
+import sqlite3
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton,
-    QLineEdit, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
-    QComboBox, QFileDialog, QInputDialog, QMessageBox
+    QLineEdit, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView,
+    QStyledItemDelegate, QComboBox, QFileDialog, QInputDialog, QMessageBox
 )
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
 import pandas as pd
 
 # --- Configuration ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-RECIPE_DATA_FILE = os.path.join(SCRIPT_DIR, "recipes.json")
+RECIPE_DATA_FILE = os.path.join(SCRIPT_DIR, "recipes.json")  # 예전 저장 파일. 있으면 처음 열 때 DB로 옮긴다
+RECIPE_DB_FILE = os.path.join(SCRIPT_DIR, "recipes.db")
+
+# --- Recipe Storage ---
+# 레시피마다 SQLite 한 행에 JSON으로 저장한다. 저장/삭제할 때 그 레시피 행만 쓰고 트랜잭션이라
+# 중간에 꺼져도 다른 레시피는 깨지지 않는다. 제목 목록은 기본키 색인에서 바로 읽는다.
+# dict처럼 in, [], del 을 쓸 수 있다.
+class RecipeStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS recipes (title TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.commit()
+
+    def migrate_json(self, json_path):
+        """예전 recipes.json을 한 트랜잭션으로 옮기고 파일은 .migrated를 붙여 남겨 둔다."""
+        if not os.path.exists(json_path): return 0
+        with open(json_path, 'r', encoding='utf-8') as f: recipes = json.load(f)
+        with self.conn:
+            # 이미 DB에 있는 제목은 DB 쪽이 최신이다
+            self.conn.executemany("INSERT OR IGNORE INTO recipes (title, data) VALUES (?, ?)",
+                                  [(title, json.dumps(recipe, ensure_ascii=False)) for title, recipe in recipes.items()])
+        os.replace(json_path, json_path + ".migrated")
+        return len(recipes)
+
+    def titles(self): return [row[0] for row in self.conn.execute("SELECT title FROM recipes ORDER BY title")]
+    def keys(self): return self.titles()
+
+    def __contains__(self, title):
+        return self.conn.execute("SELECT 1 FROM recipes WHERE title = ?", (title,)).fetchone() is not None
+
+    def __getitem__(self, title):
+        row = self.conn.execute("SELECT data FROM recipes WHERE title = ?", (title,)).fetchone()
+        if row is None: raise KeyError(title)
+        return json.loads(row[0])
+
+    def __setitem__(self, title, recipe):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO recipes (title, data) VALUES (?, ?)",
+                              (title, json.dumps(recipe, ensure_ascii=False)))
+
+    def __delitem__(self, title):
+        with self.conn: self.conn.execute("DELETE FROM recipes WHERE title = ?", (title,))
+
+    def close(self): self.conn.close()
+
+# --- Table Models ---
+# 재료/조리 단계 표는 레시피의 행 dict 목록을 그대로 보여주는 모델이다.
+# 셀마다 위젯을 만들지 않으므로 레시피를 열 때 화면에 보이는 행만 그린다.
+class RecipeTableModel(QAbstractTableModel):
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.rows = []
+
+    def set_rows(self, headers, rows):
+        self.beginResetModel()
+        self.headers = list(headers); self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.rows)
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole): return None
+        return str(self.rows[index.row()].get(self.headers[index.column()], ""))
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole: return False
+        self.rows[index.row()][self.headers[index.column()]] = value
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole: return None
+        if orientation == Qt.Horizontal: return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def insert_row(self, row_data=None):
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append(row_data if row_data is not None else {})
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def insert_column(self, name):
+        col = len(self.headers)
+        self.beginInsertColumns(QModelIndex(), col, col)
+        self.headers.append(name)
+        self.endInsertColumns()
+
+    def remove_column(self, col):
+        self.beginRemoveColumns(QModelIndex(), col, col)
+        name = self.headers.pop(col)
+        for row in self.rows: row.pop(name, None)
+        self.endRemoveColumns()
+
+    def replace_values(self, name, old, new):
+        # name 열에서 값이 old 인 셀을 모두 new 로 바꾼다
+        if name not in self.headers: return
+        col = self.headers.index(name)
+        for row in self.rows:
+            if row.get(name) == old: row[name] = new
+        if self.rows: self.dataChanged.emit(self.index(0, col), self.index(len(self.rows) - 1, col), [Qt.DisplayRole, Qt.EditRole])
+
+class PropertyComboDelegate(QStyledItemDelegate):
+    """조리 단계의 속성 열. 편집하는 셀에만 재료 열 이름 콤보박스를 연다."""
+    def __init__(self, options, parent=None):
+        super().__init__(parent)
+        self.options = options  # 지금 재료 열 이름 목록을 돌려주는 함수
+
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.addItems(self.options())
+        combo.activated.connect(lambda: (self.commitData.emit(combo), self.closeEditor.emit(combo)))
+        return combo
+
+    def setEditorData(self, editor, index):
+        # 목록에 없는 값이면 아무것도 고르지 않은 채로 연다 (첫 항목이 저장되지 않게)
+        editor.setCurrentIndex(editor.findText(index.data(Qt.EditRole)))
+
+    def setModelData(self, editor, model, index):
+        # 사용자가 다른 항목을 골랐을 때만 저장한다
+        if editor.currentIndex() > -1 and editor.currentText() != index.data(Qt.EditRole):
+            model.setData(index, editor.currentText(), Qt.EditRole)
 
 class RecipeManager(QMainWindow):
     def __init__(self):
@@ -30,10 +163,16 @@ class RecipeManager(QMainWindow):
         self.recipe_selector.currentIndexChanged.connect(self.display_selected_recipe)
         self.title_input = QLineEdit()
         self.title_input.setPlaceholderText("레시피 제목을 입력하세요")
-        self.ingredient_table = QTableWidget(0, 2)
-        self.ingredient_table.setHorizontalHeaderLabels([self.INGREDIENT_NAME_COLUMN, "Recipe"])
-        self.step_table = QTableWidget(0, 1)
-        self.step_table.setHorizontalHeaderLabels([self.STEP_PROPERTY_COLUMN])
+        self.ingredient_model = RecipeTableModel([self.INGREDIENT_NAME_COLUMN, "Recipe"], self)
+        self.ingredient_table = QTableView()
+        self.ingredient_table.setModel(self.ingredient_model)
+        self.step_model = RecipeTableModel([self.STEP_PROPERTY_COLUMN], self)
+        self.step_table = QTableView()
+        self.step_table.setModel(self.step_model)
+        self.property_delegate = PropertyComboDelegate(self.get_ingredient_headers, self.step_table)
+        self.step_table.setItemDelegateForColumn(0, self.property_delegate)
+        self.step_table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked
+                                        | QAbstractItemView.EditKeyPressed | QAbstractItemView.AnyKeyPressed)
         
         main_layout = QVBoxLayout()
         top_controls_layout = QHBoxLayout()
@@ -112,7 +251,6 @@ class RecipeManager(QMainWindow):
         recipe_data = self.recipe_store[title]
         self.title_input.setText(title)
         
-        self.ingredient_table.blockSignals(True)
         ingredients = recipe_data.get("ingredients", [])
         all_headers = set(); [all_headers.update(d.keys()) for d in ingredients]
         header_list = []
@@ -120,129 +258,83 @@ class RecipeManager(QMainWindow):
             header_list.append(self.INGREDIENT_NAME_COLUMN)
             all_headers.remove(self.INGREDIENT_NAME_COLUMN)
         header_list.extend(sorted(list(all_headers)))
-        self.ingredient_table.setRowCount(0); self.ingredient_table.setColumnCount(len(header_list))
-        self.ingredient_table.setHorizontalHeaderLabels(header_list)
-        self.ingredient_table.setRowCount(len(ingredients))
-        for r, d in enumerate(ingredients):
-            for c, h in enumerate(header_list):
-                self.ingredient_table.setItem(r, c, QTableWidgetItem(str(d.get(h, ""))))
-        self.ingredient_table.blockSignals(False)
-        
-        self.update_step_property_options()
+        # 저장하기 전까지 recipe_store를 건드리지 않도록 행 dict는 복사해서 넘긴다
+        self.ingredient_model.set_rows(header_list, [dict(d) for d in ingredients])
         
-        self.step_table.setRowCount(0)
         step_data = recipe_data.get("steps", {})
-        step_rows = step_data.get("rows", [])
         step_columns = step_data.get("columns", [self.STEP_PROPERTY_COLUMN])
-        self.step_table.setColumnCount(len(step_columns))
-        self.step_table.setHorizontalHeaderLabels(step_columns)
-        self.step_table.setRowCount(len(step_rows))
-        
-        for row_idx, row_data in enumerate(step_rows):
-            prop_combo = QComboBox()
-            prop_combo.addItems(self.get_ingredient_headers())
-            prop_value = row_data.get(self.STEP_PROPERTY_COLUMN, row_data.get("ingredient", ""))
-            prop_combo.setCurrentText(prop_value)
-            self.step_table.setCellWidget(row_idx, 0, prop_combo)
-            
-            for col_idx, col_name in enumerate(step_columns[1:], start=1):
-                item = QTableWidgetItem(row_data.get(col_name, ""))
-                self.step_table.setItem(row_idx, col_idx, item)
+        step_rows = [{self.STEP_PROPERTY_COLUMN: row_data.get(self.STEP_PROPERTY_COLUMN, row_data.get("ingredient", "")),
+                      **{col_name: row_data.get(col_name, "") for col_name in step_columns[1:]}}
+                     for row_data in step_data.get("rows", [])]
+        self.step_model.set_rows(step_columns, step_rows)
 
     def save_current_recipe(self):
         title = self.title_input.text().strip()
         if not title: QMessageBox.warning(self, "입력 오류", "레시피 제목을 입력하세요."); return
 
         ingredients = []
-        headers = [self.ingredient_table.horizontalHeaderItem(i).text() for i in range(self.ingredient_table.columnCount())]
-        for row in range(self.ingredient_table.rowCount()):
-            ing_dict = {h: self.ingredient_table.item(row, c).text() for c, h in enumerate(headers) if self.ingredient_table.item(row, c) and self.ingredient_table.item(row, c).text().strip()}
+        headers = self.ingredient_model.headers
+        for row in self.ingredient_model.rows:
+            ing_dict = {h: str(row[h]) for h in headers if str(row.get(h, "")).strip()}
             if ing_dict: ingredients.append(ing_dict)
 
-        step_columns = [self.step_table.horizontalHeaderItem(i).text() for i in range(self.step_table.columnCount())]
-        step_rows = []
-        for row in range(self.step_table.rowCount()):
-            row_data = {}
-            prop_combo = self.step_table.cellWidget(row, 0)
-            if prop_combo:
-                row_data[self.STEP_PROPERTY_COLUMN] = prop_combo.currentText()
-            
-            for col_idx, col_name in enumerate(step_columns[1:], start=1):
-                item = self.step_table.item(row, col_idx)
-                if item: row_data[col_name] = item.text()
-            step_rows.append(row_data)
-
-        self.recipe_store[title] = { "ingredients": ingredients, "steps": {"columns": step_columns, "rows": step_rows} }
-        self.save_data_to_file()
+        step_columns = list(self.step_model.headers)
+        step_rows = [{col_name: row[col_name] for col_name in step_columns if col_name in row} for row in self.step_model.rows]
+
+        try:
+            self.recipe_store[title] = { "ingredients": ingredients, "steps": {"columns": step_columns, "rows": step_rows} }
+        except sqlite3.Error as e: QMessageBox.critical(self, "Save Error", f"Could not save to {RECIPE_DB_FILE}: {e}"); return
         self.update_recipe_selector()
         self.recipe_selector.setCurrentText(title)
         QMessageBox.information(self, "성공", f"'{title}' 레시피가 파일에 저장되었습니다.")
 
-    def add_ingredient_row(self): self.ingredient_table.insertRow(self.ingredient_table.rowCount())
+    def add_ingredient_row(self): self.ingredient_model.insert_row()
     def delete_ingredient_row(self):
-        if self.ingredient_table.currentRow() > -1: self.ingredient_table.removeRow(self.ingredient_table.currentRow())
+        if self.ingredient_table.currentIndex().row() > -1: self.ingredient_model.remove_row(self.ingredient_table.currentIndex().row())
     def add_ingredient_column(self):
         text, ok = QInputDialog.getText(self, "새 속성 추가", "추가할 열의 이름을 입력하세요:")
         if ok and text.strip():
             if text in self.get_ingredient_headers():
                 QMessageBox.warning(self, "오류", "같은 이름의 열이 이미 존재합니다."); return
-            col_pos = self.ingredient_table.columnCount()
-            self.ingredient_table.insertColumn(col_pos)
-            self.ingredient_table.setHorizontalHeaderItem(col_pos, QTableWidgetItem(text))
-            self.update_step_property_options()
+            # 조리 단계의 속성 콤보는 열 때마다 재료 열 이름을 새로 읽으므로 따로 고칠 것이 없다
+            self.ingredient_model.insert_column(text)
     def delete_ingredient_column(self):
-        col = self.ingredient_table.currentColumn()
+        col = self.ingredient_table.currentIndex().column()
         if col > -1:
-            header = self.ingredient_table.horizontalHeaderItem(col).text()
+            header = self.ingredient_model.headers[col]
             if header == self.INGREDIENT_NAME_COLUMN:
                 QMessageBox.warning(self, "오류", f"기본 '{self.INGREDIENT_NAME_COLUMN}' 열은 삭제할 수 없습니다."); return
-            self.ingredient_table.removeColumn(col)
-            self.update_step_property_options()
+            self.ingredient_model.remove_column(col)
+            # 지운 열을 가리키던 조리 단계 속성은 첫 재료 열로 바꾼다 (새 단계 행의 기본값과 같다)
+            property_names = self.get_ingredient_headers()
+            self.step_model.replace_values(self.STEP_PROPERTY_COLUMN, header, property_names[0] if property_names else "")
 
     def get_ingredient_headers(self):
-        return [self.ingredient_table.horizontalHeaderItem(i).text() for i in range(self.ingredient_table.columnCount())]
+        return list(self.ingredient_model.headers)
 
     def add_step_row(self):
-        row = self.step_table.rowCount()
-        self.step_table.insertRow(row)
-        prop_combo = QComboBox()
-        prop_combo.addItems(self.get_ingredient_headers())
-        self.step_table.setCellWidget(row, 0, prop_combo)
+        property_names = self.get_ingredient_headers()
+        self.step_model.insert_row({self.STEP_PROPERTY_COLUMN: property_names[0] if property_names else ""})
     def delete_step_row(self):
-        if self.step_table.currentRow() > -1: self.step_table.removeRow(self.step_table.currentRow())
+        if self.step_table.currentIndex().row() > -1: self.step_model.remove_row(self.step_table.currentIndex().row())
     def add_step_column(self):
-        col = self.step_table.columnCount()
         step_num = 1
-        while f"Step {step_num}" in [self.step_table.horizontalHeaderItem(i).text() for i in range(1, col)]: step_num += 1
-        self.step_table.insertColumn(col)
-        self.step_table.setHorizontalHeaderItem(col, QTableWidgetItem(f"Step {step_num}"))
-        
-    def update_step_property_options(self):
-        property_names = self.get_ingredient_headers()
-        for row in range(self.step_table.rowCount()):
-            combo = self.step_table.cellWidget(row, 0)
-            if isinstance(combo, QComboBox):
-                current_text = combo.currentText()
-                combo.blockSignals(True)
-                combo.clear()
-                combo.addItems(property_names)
-                if current_text in property_names:
-                    combo.setCurrentText(current_text)
-                combo.blockSignals(False)
+        while f"Step {step_num}" in self.step_model.headers[1:]: step_num += 1
+        self.step_model.insert_column(f"Step {step_num}")
     
     def load_data_from_file(self):
-        if not os.path.exists(RECIPE_DATA_FILE): self.recipe_store = {}; return
-        try:
-            with open(RECIPE_DATA_FILE, 'r', encoding='utf-8') as f: self.recipe_store = json.load(f)
-            self.update_recipe_selector()
-        except (json.JSONDecodeError, FileNotFoundError): self.recipe_store = {}; QMessageBox.warning(self, "Load Error", f"Could not load {RECIPE_DATA_FILE}. Starting fresh.")
-    def save_data_to_file(self):
-        try:
-            with open(RECIPE_DATA_FILE, 'w', encoding='utf-8') as f: json.dump(self.recipe_store, f, indent=4, ensure_ascii=False)
-        except Exception as e: QMessageBox.critical(self, "Save Error", f"Could not save to {RECIPE_DATA_FILE}: {e}")
+        try: self.recipe_store = RecipeStore(RECIPE_DB_FILE)
+        except sqlite3.Error as e:
+            self.recipe_store = RecipeStore(":memory:"); QMessageBox.warning(self, "Load Error", f"Could not open {RECIPE_DB_FILE}: {e}. Starting fresh.")
+        try: self.recipe_store.migrate_json(RECIPE_DATA_FILE)
+        except (json.JSONDecodeError, OSError, sqlite3.Error): QMessageBox.warning(self, "Load Error", f"Could not load {RECIPE_DATA_FILE}. It was left in place and not migrated.")
+        self.update_recipe_selector()
+    def closeEvent(self, event):
+        if isinstance(self.recipe_store, RecipeStore): self.recipe_store.close()
+        super().closeEvent(event)
     def update_recipe_selector(self):
         current_selection = self.recipe_selector.currentText(); self.recipe_selector.blockSignals(True)
-        self.recipe_selector.clear(); self.recipe_selector.addItems(sorted(self.recipe_store.keys()))
+        self.recipe_selector.clear(); self.recipe_selector.addItems(self.recipe_store.titles())
         self.recipe_selector.setCurrentText(current_selection); self.recipe_selector.blockSignals(False)
         if self.recipe_selector.currentIndex() == -1 and self.recipe_selector.count() > 0: self.recipe_selector.setCurrentIndex(0)
         elif self.recipe_selector.count() == 0: self.clear_ui_for_new_recipe()
@@ -251,7 +343,9 @@ class RecipeManager(QMainWindow):
         if not title: return
         reply = QMessageBox.question(self, "삭제 확인", f"'{title}' 레시피를 정말 삭제하시겠습니까?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes and title in self.recipe_store:
-            del self.recipe_store[title]; self.save_data_to_file(); self.update_recipe_selector()
+            try: del self.recipe_store[title]
+            except sqlite3.Error as e: QMessageBox.critical(self, "Save Error", f"Could not save to {RECIPE_DB_FILE}: {e}"); return
+            self.update_recipe_selector()
             QMessageBox.information(self, "성공", f"'{title}' 레시피가 삭제되었습니다.")
     def export_to_excel(self):
         title = self.title_input.text().strip();
@@ -268,10 +362,8 @@ class RecipeManager(QMainWindow):
         except Exception as e: QMessageBox.critical(self, "내보내기 실패", f"내보내기 중 오류 발생: {e}")
     def clear_ui_for_new_recipe(self):
         self.title_input.clear()
-        self.ingredient_table.setRowCount(0); self.ingredient_table.setColumnCount(2)
-        self.ingredient_table.setHorizontalHeaderLabels([self.INGREDIENT_NAME_COLUMN, "Recipe"])
-        self.step_table.setRowCount(0); self.step_table.setColumnCount(1)
-        self.step_table.setHorizontalHeaderLabels([self.STEP_PROPERTY_COLUMN])
+        self.ingredient_model.set_rows([self.INGREDIENT_NAME_COLUMN, "Recipe"], [])
+        self.step_model.set_rows([self.STEP_PROPERTY_COLUMN], [])
         self.recipe_selector.setCurrentIndex(-1)
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+# ranked_search.py
+# 역색인 검색 앱(app2.py)의 /api/search 순위 검색
+#
+# 검색어 단어마다 BM25 점수를 더해 상위 RANK_LIMIT 개 문서만 heap으로 고른다. 색인에 없는 단어는
+# 오타 교정 색인으로 가장 가까운 단어를 대신 찾는다. 순위 목록은 (정규화한 검색어, 색인 버전)
+# 을 키로 LRU 캐시에 두므로 같은 검색어의 다음 페이지나 반복 검색은 점수를 다시 매기지 않는다.
+#
+# 페이지는 마지막으로 보낸 (점수, 문서 ID) 를 담은 cursor 다음부터 잘라 준다. 그 사이 색인이
+# 바뀌어도 이미 보낸 문서와 겹치지 않는다. 본문 전체 대신 맞은 단어 주변만 snippet 으로 보낸다.
+import math
+import heapq
+import json
+import base64
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from inverted_store import tokenize
+from search_metrics import NULL_TIMER
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RANK_LIMIT = 1000  # 순위를 매겨 캐시에 둘 최대 문서 수 (이 뒤로는 페이지를 넘길 수 없다)
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+SNIPPET_WORDS = 20  # snippet 으로 보낼 단어 수
+CACHE_SIZE = 256  # 순위 목록을 캐시해 둘 최근 검색어 수
+
+def normalize_query(text):
+    """캐시 키로 쓸 검색어 단어들 (중복을 빼고 정렬)."""
+    return tuple(sorted(set(tokenize(text))))
+
+def encode_cursor(entry):
+    neg_score, doc_id = entry
+    return base64.urlsafe_b64encode(json.dumps([neg_score, doc_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        neg_score, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(neg_score), int(doc_id)
+    except (ValueError, TypeError):
+        raise ValueError('cursor가 올바르지 않습니다') from None
+
+class Ranking:
+    """검색어 하나의 순위 목록. entries 는 (-점수, 문서 ID) 오름차순 (점수 높은 순, 같으면 ID 순)."""
+
+    def __init__(self, entries, total, words, corrections):
+        self.entries = entries
+        self.total = total  # 맞은 문서 수 (RANK_LIMIT 보다 많을 수 있다)
+        self.words = words  # snippet 에서 찾을 단어 (교정한 단어 포함)
+        self.corrections = corrections
+
+def rank(index, words, timer=NULL_TIMER):
+    corrections = {}
+    matched = set()
+    n = max(index.doc_count, 1)
+    avg_length = index.avg_doc_length or 1.0
+    scores = {}
+    for word in words:
+        with timer.stage('lookup'):
+            postings = index.postings(word)
+        if postings is None:
+            with timer.stage('fuzzy'):
+                close = index.correct(word)
+            if close is None:
+                continue
+            corrections[word] = close
+            word = close
+            with timer.stage('lookup'):
+                postings = index.postings(word)
+            if postings is None:
+                continue
+        matched.add(word)
+        with timer.stage('rank'):
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * index.doc_length(doc_id) / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+    # 전체를 정렬하지 않고 heap으로 상위 RANK_LIMIT 개만 고른다
+    with timer.stage('rank'):
+        entries = heapq.nsmallest(RANK_LIMIT, ((-score, doc_id) for doc_id, score in scores.items()))
+    return Ranking(entries, len(scores), matched, corrections)
+
+def snippet(text, words):
+    """words 중 처음 나온 단어 주변 SNIPPET_WORDS 단어."""
+    tokens = text.split()
+    start = 0
+    for i, token in enumerate(tokens):
+        if words.intersection(tokenize(token)):
+            start = max(0, i - SNIPPET_WORDS // 4)
+            break
+    end = start + SNIPPET_WORDS
+    return ('… ' if start else '') + ' '.join(tokens[start:end]) + (' …' if end < len(tokens) else '')
+
+class RankingCache:
+    """(검색어 단어들, 색인 버전) -> Ranking LRU. 여러 요청 스레드가 같이 쓴다."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            ranking = self._items.get(key)
+            if ranking is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return ranking
+
+    def put(self, key, ranking):
+        with self._lock:
+            self._items[key] = ranking
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+def search(index, text, cursor=None, limit=PAGE_SIZE, cache=None, timer=NULL_TIMER):
+    """/api/search 응답 dict. index 는 store.view() 로 얻은 색인."""
+    with timer.stage('tokenize'):
+        words = normalize_query(text)
+    key = (words, index.seq)
+    ranking = cache.get(key) if cache is not None else None
+    if ranking is None:
+        ranking = rank(index, words, timer)
+        if cache is not None:
+            cache.put(key, ranking)
+    start = bisect_right(ranking.entries, decode_cursor(cursor)) if cursor else 0
+    page = ranking.entries[start:start + limit]
+    with timer.stage('render'):
+        results = [{'id': doc_id, 'score': round(-neg_score, 4),
+                    'snippet': snippet(index.document(doc_id) or '', ranking.words)}
+                   for neg_score, doc_id in page]
+    more = start + limit < len(ranking.entries)
+    return {'query': ' '.join(words), 'version': index.seq, 'total': ranking.total,
+            'corrections': ranking.corrections, 'results': results,
+            'next_cursor': encode_cursor(page[-1]) if more and page else None}
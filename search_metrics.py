@@ -0,0 +1,67 @@
+# search_metrics.py
+# 역색인 검색 앱(app2.py)의 단계별 처리 시간 (tokenize, lookup, fuzzy, rank, render)
+#
+# 요청마다 RequestTimer 로 단계별 시간을 더해 두었다가 요청이 끝나면 StageMetrics 에 한 건으로
+# 기록한다. 단계마다 최근 SAMPLES 건으로 p50/p95/p99 를 내고, share 는 전체 요청 시간 중 그
+# 단계가 차지한 비율이다. GET /api/metrics 로 보고 DELETE /api/metrics 로 비운다.
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from bench_common import percentiles
+
+SAMPLES = 10000  # 단계마다 백분위수를 낼 최근 요청 수
+
+class RequestTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+class NullTimer:
+    """시간을 재지 않을 때 RequestTimer 대신 넘긴다."""
+
+    def stage(self, name):
+        return nullcontext()
+
+NULL_TIMER = NullTimer()
+
+class StageMetrics:
+    def __init__(self, samples=SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self._totals = {}  # 단계 -> (요청 수, 누적 초)
+            self._recent = {}  # 단계 -> 최근 SAMPLES 건의 초
+
+    def record(self, timer):
+        elapsed = time.perf_counter() - timer.started
+        with self._lock:
+            self.requests += 1
+            for stage, seconds in [('total', elapsed), *timer.stages.items()]:
+                count, total = self._totals.get(stage, (0, 0.0))
+                self._totals[stage] = (count + 1, total + seconds)
+                recent = self._recent.get(stage)
+                if recent is None:
+                    recent = self._recent[stage] = deque(maxlen=self.samples)
+                recent.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            request_seconds = self._totals.get('total', (0, 0.0))[1]
+            result = {}
+            for stage, (count, total) in self._totals.items():
+                result[stage] = dict(percentiles(self._recent[stage]), count=count, total_s=total,
+                                     share=total / request_seconds if request_seconds else 0.0)
+            return {'requests': self.requests, 'stages': result}
@@ -0,0 +1,328 @@
+# segments.py
+# 문서 검색 앱의 세그먼트 색인 (작은 LSM)
+#
+# 색인할 때마다 새로 추출한 문서만 새 세그먼트로 쓰고 예전 세그먼트는 고치지 않는다.
+# 세그먼트 하나는 index_format.py 색인 파일 (seg_NNNNNN.bin) 과 line_store.py 본문 저장소
+# (seg_NNNNNN.dat) 한 쌍이다. 다시 추출되거나 지워진 문서는 세그먼트 목록에 세그먼트별
+# 삭제 doc id로만 남기고, 작은 세그먼트들은 merge_segments 로 합치면서 삭제된 문서를 버린다.
+#
+#   segments.pkl : {'next': 다음 세그먼트 번호,
+#                   'segments': [{'name', 'docs': 문서 수, 'deleted': {doc id, ...}}, ...]}
+#
+# 검색할 때는 SegmentedIndex 가 모든 세그먼트를 한 색인처럼 보여준다.
+# 전체 doc id = 세그먼트 시작 번호 + 세그먼트 안 doc id.
+import os
+import math
+import pickle
+from array import array
+from bisect import bisect_right
+from index_format import InvertedIndex, MappedIndex, write_index, iter_pairs
+from line_store import LineStore, LineStoreWriter, NO_RECORD
+
+STATE_FILE = 'segments.pkl'
+SEGMENT_DOCS = 5000  # 색인 중 세그먼트 하나에 모을 최대 문서 수 (색인 메모리 상한)
+MERGE_FACTOR = 4  # 크기 단계가 같은 세그먼트가 이만큼 쌓이면 하나로 합친다
+PURGE_RATIO = 0.5  # 삭제된 문서가 이 비율을 넘는 세그먼트는 혼자라도 다시 쓴다
+
+def segment_name(number):
+    return f'seg_{number:06d}'
+
+def segment_paths(directory, name):
+    return os.path.join(directory, f'{name}.bin'), os.path.join(directory, f'{name}.dat')
+
+# ---------------------
+# State
+# ---------------------
+def empty_state():
+    return {'next': 1, 'segments': []}
+
+def load_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def save_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(tmp_path, path)
+
+def commit_segments(state, written, deleted, next_number, replace=False):
+    """색인 한 번의 결과를 반영한 새 state를 돌려준다.
+
+    written 은 새 세그먼트 정보 목록, deleted 는 지울 (세그먼트 이름, doc id) 목록.
+    replace 면 예전 세그먼트를 모두 버린다. 문서가 모두 지워진 세그먼트는 목록에서 뺀다.
+    """
+    segments = [] if replace else [dict(info, deleted=set(info['deleted'])) for info in state['segments']]
+    by_name = {info['name']: info for info in segments}
+    for name, doc_id in deleted:
+        if name in by_name:
+            by_name[name]['deleted'].add(doc_id)
+    segments = [info for info in segments if len(info['deleted']) < info['docs']] + list(written)
+    return {'next': next_number, 'segments': segments}
+
+def remove_unused(directory, state):
+    """목록에 없는 세그먼트 파일을 지운다. 아직 열려 있으면 (Windows) 다음에 다시 시도한다."""
+    live = {info['name'] for info in state['segments']}
+    for file in os.listdir(directory):
+        name, ext = os.path.splitext(file)
+        if name.startswith('seg_') and ext in ('.bin', '.dat', '.tmp') and name not in live:
+            try:
+                os.remove(os.path.join(directory, file))
+            except OSError:
+                pass
+
+def adopt_index(directory, index_path, line_store_path, manifest):
+    """세그먼트 이전의 단일 색인 파일을 첫 세그먼트로 옮기고 manifest에 위치를 채운다."""
+    with MappedIndex(index_path) as index:
+        doc_count = index.doc_count
+        doc_ids = {index.doc_path(doc_id): doc_id for doc_id in range(doc_count)}
+    name = segment_name(1)
+    bin_path, dat_path = segment_paths(directory, name)
+    os.replace(index_path, bin_path)
+    if os.path.exists(line_store_path):
+        os.replace(line_store_path, dat_path)
+    else:
+        open(dat_path, 'wb').close()
+    for file, entry in manifest.items():
+        if file in doc_ids:
+            entry['segment'], entry['doc'] = name, doc_ids[file]
+    state = {'next': 2, 'segments': [{'name': name, 'docs': doc_count, 'deleted': set()}]}
+    save_state(directory, state)
+    return state
+
+# ---------------------
+# Writer
+# ---------------------
+class SegmentWriter:
+    """색인 중에 새 세그먼트를 만든다. SEGMENT_DOCS 개마다 끊어서 파일로 내보낸다."""
+
+    def __init__(self, directory, next_number, ngrams=True, segment_docs=SEGMENT_DOCS):
+        self.directory = directory
+        self.next_number = next_number
+        self.ngrams = ngrams
+        self.segment_docs = segment_docs
+        self.written = []
+        self._name = None
+        self._index = None
+        self._lines_out = None
+
+    def add(self, path, title_words, line_words, lines, pages=()):
+        """문서 하나를 넣고 (세그먼트 이름, 세그먼트 안 doc id) 를 돌려준다."""
+        if self._index is None:
+            self._name = segment_name(self.next_number)
+            self.next_number += 1
+            self._index = InvertedIndex()
+            self._lines_out = LineStoreWriter(segment_paths(self.directory, self._name)[1])
+        record = self._lines_out.add(lines, pages) if lines else NO_RECORD
+        doc_id = self._index.add_document(path, title_words, line_words, record)
+        location = self._name, doc_id
+        if len(self._index.docs) >= self.segment_docs:
+            self.flush()
+        return location
+
+    def flush(self):
+        if self._index is None:
+            return
+        self._lines_out.close()
+        write_index(segment_paths(self.directory, self._name)[0], self._index, ngrams=self.ngrams)
+        self.written.append({'name': self._name, 'docs': len(self._index.docs), 'deleted': set()})
+        self._name = self._index = self._lines_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.flush()
+        elif self._lines_out is not None:
+            self._lines_out.close()
+
+# ---------------------
+# Merging
+# ---------------------
+def live_docs(info):
+    return info['docs'] - len(info['deleted'])
+
+def plan_merge(state):
+    """합칠 세그먼트 이름 목록. 합칠 것이 없으면 빈 목록.
+
+    살아 있는 문서 수를 MERGE_FACTOR 로그 단계로 나눠 한 단계에 MERGE_FACTOR 개 이상 쌓이면
+    그 단계를 합치고, 아니면 삭제가 많은 세그먼트 하나를 다시 쓴다.
+    """
+    tiers = {}
+    for info in state['segments']:
+        tier = int(math.log(max(live_docs(info), 1), MERGE_FACTOR))
+        tiers.setdefault(tier, []).append(info['name'])
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= MERGE_FACTOR:
+            return tiers[tier]
+    for info in state['segments']:
+        if len(info['deleted']) > PURGE_RATIO * info['docs']:
+            return [info['name']]
+    return []
+
+def merge_segments(directory, state, names, ngrams=True):
+    """names 세그먼트들을 새 세그먼트 하나로 합친다. (새 state, {(이름, 옛 doc id): 새 doc id}).
+
+    삭제된 문서는 postings와 본문 모두 버린다. 합치는 세그먼트들의 postings는 메모리에 올린다.
+    """
+    name = segment_name(state['next'])
+    bin_path, dat_path = segment_paths(directory, name)
+    merged = InvertedIndex()
+    remap = {}
+    with LineStoreWriter(dat_path) as lines_out:
+        for info in state['segments']:
+            if info['name'] not in names:
+                continue
+            seg_bin, seg_dat = segment_paths(directory, info['name'])
+            with MappedIndex(seg_bin) as seg, LineStore(seg_dat) as store:
+                base = len(merged.docs)
+                for doc_id in range(seg.doc_count):
+                    if doc_id in info['deleted']:
+                        merged.docs.append(None)
+                        merged.records.append(NO_RECORD)
+                        merged.lengths.append(0)
+                        continue
+                    record = seg.doc_record(doc_id)
+                    if record != NO_RECORD:
+                        record = lines_out.add_record(store.record_bytes(record))
+                    remap[info['name'], doc_id] = len(remap)
+                    merged.docs.append(str(seg.doc_path(doc_id)))
+                    merged.records.append(record)
+                    merged.lengths.append(seg.doc_length(doc_id))
+                for i in range(seg.term_count):
+                    postings = merged.postings.setdefault(seg.term(i), array('I'))
+                    for doc_id, slot in iter_pairs(seg.raw_postings(i)):
+                        postings.append(base + doc_id)
+                        postings.append(slot)
+    write_index(bin_path, merged, ngrams=ngrams)
+
+    info = {'name': name, 'docs': len(remap), 'deleted': set()}
+    segments = []
+    for old in state['segments']:
+        if old['name'] not in names:
+            segments.append(old)
+        elif info is not None:
+            if info['docs']:
+                segments.append(info)
+            info = None
+    return {'next': state['next'] + 1, 'segments': segments}, remap
+
+# ---------------------
+# Reader
+# ---------------------
+class SegmentPostings:
+    """여러 세그먼트의 TermPostings를 전체 doc id로 옮겨 하나처럼 잇는다. 삭제된 문서는 건너뛴다."""
+
+    def __init__(self, parts):
+        self.parts = parts  # [(시작 번호, TermPostings, 삭제 doc id), ...]
+        self.count = sum(postings.count for _, postings, _ in parts)
+        self._bases = [base for base, _, _ in parts]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for base, postings, deleted in self.parts:
+            for doc_id, slot in postings:
+                if doc_id not in deleted:
+                    yield base + doc_id, slot
+
+    def slots_of(self, doc_id):
+        i = bisect_right(self._bases, doc_id) - 1
+        if i < 0:
+            return []
+        base, postings, deleted = self.parts[i]
+        if doc_id - base in deleted:
+            return []
+        return postings.slots_of(doc_id - base)
+
+class SegmentedIndex:
+    """세그먼트들을 한 색인처럼 여는 읽기 전용 색인. QueryEngine 에서 MappedIndex 대신 쓴다."""
+
+    def __init__(self, directory, state):
+        self.directory = directory
+        self.segments = []  # [(MappedIndex, LineStore, 삭제 doc id), ...]
+        self.names = []
+        self.bases = []
+        base = total_length = doc_count = 0
+        try:
+            for info in state['segments']:
+                bin_path, dat_path = segment_paths(directory, info['name'])
+                index = MappedIndex(bin_path)
+                self.segments.append((index, LineStore(dat_path), info['deleted']))
+                self.names.append(info['name'])
+                self.bases.append(base)
+                base += index.doc_count
+                doc_count += index.doc_count - len(info['deleted'])
+                total_length += index.total_length
+        except Exception:
+            self.close()
+            raise
+        # 삭제된 문서의 단어 수는 빼지 않으므로 평균 길이는 근사값
+        self.doc_count = doc_count
+        self.avg_doc_length = total_length / base if base else 0.0
+
+    def close(self):
+        for index, store, _ in self.segments:
+            index.close()
+            store.close()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _locate(self, doc_id):
+        i = bisect_right(self.bases, doc_id) - 1
+        return self.segments[i], doc_id - self.bases[i]
+
+    def location(self, doc_id):
+        """(세그먼트 이름, 세그먼트 안 doc id) — manifest에 적힌 위치와 같은 꼴."""
+        i = bisect_right(self.bases, doc_id) - 1
+        return self.names[i], doc_id - self.bases[i]
+
+    def doc_path(self, doc_id):
+        (index, _, _), local = self._locate(doc_id)
+        return index.doc_path(local)
+
+    def doc_length(self, doc_id):
+        (index, _, _), local = self._locate(doc_id)
+        return index.doc_length(local)
+
+    def line(self, doc_id, i):
+        (index, store, _), local = self._locate(doc_id)
+        return store.line(index.doc_record(local), i)
+
+    def page_of(self, doc_id, i):
+        (index, store, _), local = self._locate(doc_id)
+        return store.page_of(index.doc_record(local), i)
+
+    def __contains__(self, term):
+        return any(term in index for index, _, _ in self.segments)
+
+    def term_postings(self, term):
+        parts = []
+        for base, (index, _, deleted) in zip(self.bases, self.segments):
+            postings = index.term_postings(term)
+            if postings is not None:
+                parts.append((base, postings, deleted))
+        return SegmentPostings(parts) if parts else None
+
+    def prefix_words(self, prefix, limit=None):
+        words = set()
+        for index, _, _ in self.segments:
+            words.update(index.prefix_words(prefix, limit))
+        return sorted(words)[:limit]
+
+    def substring_words(self, text, limit=None):
+        words = set()
+        for index, _, _ in self.segments:
+            words.update(index.substring_words(text, limit))
+        return sorted(words)[:limit]
@@ -0,0 +1,262 @@
+# shared_index.py
+# 역색인 검색 앱(app2.py)의 읽기 전용 공유 색인 (여러 워커 프로세스가 mmap으로 같이 연다)
+#
+# inverted_store.py 가 스냅샷을 쓸 때마다 inverted_index.bin 으로 한 번 컴파일해 둔다.
+# 워커는 JSON을 읽거나 set을 만들지 않고 파일을 mmap으로 열어, 찾는 단어의 postings만
+# 그때그때 풀어 읽는다. 같은 파일을 여는 워커들은 page cache의 한 벌을 나눠 쓴다.
+#
+#   header   : magic, version, max_distance, prefix_length, seq, doc_count, term_count,
+#              variant_count, 각 구역의 시작 위치, 전체 단어 수 (BM25 평균 문서 길이용)
+#   docs     : doc_count+1 개의 (doc id, 본문 오프셋, 단어 수) u64 + utf-8 본문 blob (doc id 순)
+#   terms    : term_count+1 개의 (단어 오프셋, postings 오프셋) u64 쌍 + utf-8 단어 blob
+#              단어는 utf-8 바이트 순으로 정렬되어 있어 이진 탐색이 가능하다
+#   postings : 단어마다 varint 개수 + (doc id 차이, 나온 횟수) varint 쌍
+#   variants : 오타 교정 색인 (fuzzy_index.py) 의 삭제 변형 표, terms와 같은 모양이며
+#              변형마다 varint 개수 + 단어 순번 차이 varint
+#
+# 새 스냅샷은 임시 파일에 다 쓴 다음 os.replace 로 바꾼다. 이미 열려 있는 mmap은 옛 파일을
+# 계속 보므로 읽는 중인 요청은 깨지지 않고, SharedIndex 가 파일이 바뀐 것을 보면 새로 연다.
+import os
+import mmap
+import time
+import struct
+import threading
+from contextlib import contextmanager
+from index_format import encode_varint, decode_varint, encode_ids, decode_ids
+from fuzzy_index import suggest, closest
+
+MAGIC = b'AIDX'
+VERSION = 2
+HEADER = struct.Struct('<4s3I13Q')
+PAIR = struct.Struct('<QQ')
+DOC_ENTRY = struct.Struct('<QQQ')
+SWAP_CHECK_SECONDS = 1.0  # 새 스냅샷이 나왔는지 파일을 확인하는 간격
+
+def encode_postings(pairs, out):
+    encode_varint(len(pairs), out)
+    prev = 0
+    for doc_id, count in pairs:
+        encode_varint(doc_id - prev, out)
+        encode_varint(count, out)
+        prev = doc_id
+
+def decode_postings(buf, pos):
+    """{doc id: 나온 횟수}"""
+    count, pos = decode_varint(buf, pos)
+    postings = {}
+    doc_id = 0
+    for _ in range(count):
+        delta, pos = decode_varint(buf, pos)
+        doc_id += delta
+        postings[doc_id], pos = decode_varint(buf, pos)
+    return postings
+
+def _write_table(f, keys, payloads):
+    """정렬된 (key 바이트, payload 바이트) 들로 (key 오프셋, payload 오프셋) 표 + key blob 을 쓰고
+    payload 들을 이어 붙인다. (표 위치, blob 위치, payload 위치) 를 돌려준다."""
+    table = f.tell()
+    key_off = payload_off = 0
+    for key, payload in zip(keys, payloads):
+        f.write(PAIR.pack(key_off, payload_off))
+        key_off += len(key)
+        payload_off += len(payload)
+    f.write(PAIR.pack(key_off, payload_off))
+    blob = f.tell()
+    for key in keys:
+        f.write(key)
+    data = f.tell()
+    for payload in payloads:
+        f.write(payload)
+    return table, blob, data
+
+def write_shared_index(path, data, fuzzy):
+    """inverted_store 스냅샷 data {'seq', 'documents', 'index': {단어: [(id, 횟수)...]}} 와
+    fuzzy (FuzzyIndex) 를 path 로 컴파일한다."""
+    documents, index = data['documents'], data['index']
+    terms = sorted(index, key=lambda word: word.encode('utf-8'))
+    term_numbers = {word: i for i, word in enumerate(terms)}
+    postings = []
+    lengths = {}
+    for word in terms:
+        out = bytearray()
+        encode_postings(index[word], out)
+        postings.append(bytes(out))
+        for doc_id, count in index[word]:
+            lengths[doc_id] = lengths.get(doc_id, 0) + count
+
+    variants = sorted(fuzzy.deletes, key=lambda variant: variant.encode('utf-8'))
+    variant_lists = []
+    for variant in variants:
+        numbers = sorted(term_numbers[fuzzy.words[word_id]] for word_id in fuzzy.deletes[variant]
+                         if fuzzy.words[word_id] in term_numbers)
+        out = bytearray()
+        encode_ids(numbers, out)
+        variant_lists.append(bytes(out))
+
+    doc_ids = sorted(documents)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        doc_table = f.tell()
+        text_off = 0
+        texts = [documents[doc_id].encode('utf-8') for doc_id in doc_ids]
+        for doc_id, text in zip(doc_ids, texts):
+            f.write(DOC_ENTRY.pack(doc_id, text_off, lengths.get(doc_id, 0)))
+            text_off += len(text)
+        f.write(DOC_ENTRY.pack(0, text_off, 0))
+        doc_blob = f.tell()
+        for text in texts:
+            f.write(text)
+        term_table, term_blob, postings_at = _write_table(
+            f, [word.encode('utf-8') for word in terms], postings)
+        variant_table, variant_blob, variant_lists_at = _write_table(
+            f, [variant.encode('utf-8') for variant in variants], variant_lists)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, fuzzy.max_distance, fuzzy.prefix_length, data['seq'],
+                            len(doc_ids), len(terms), len(variants), doc_table, doc_blob,
+                            term_table, term_blob, postings_at, variant_table, variant_blob,
+                            variant_lists_at, sum(lengths.values())))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# ---------------------
+# Reader
+# ---------------------
+class MappedSharedIndex:
+    """mmap으로 연 공유 색인 한 벌. InvertedStore 와 같은 읽기 메서드를 가진다."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.max_distance, self.prefix_length, self.seq, self.doc_count,
+         self.term_count, self.variant_count, self._doc_table, self._doc_blob,
+         self._term_table, self._term_blob, self._postings, self._variant_table,
+         self._variant_blob, self._variant_lists, self.total_length) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f'{path}: 지원하지 않는 색인 형식입니다')
+        self.avg_doc_length = self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def _key(self, table, blob, i):
+        start, _ = PAIR.unpack_from(self._mm, table + PAIR.size * i)
+        end, _ = PAIR.unpack_from(self._mm, table + PAIR.size * (i + 1))
+        return self._mm[blob + start:blob + end]
+
+    def _find(self, table, blob, count, key):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(table, blob, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < count and self._key(table, blob, lo) == key:
+            return lo
+        return -1
+
+    def _term_postings_at(self, i):
+        _, data_off = PAIR.unpack_from(self._mm, self._term_table + PAIR.size * i)
+        return self._postings + data_off
+
+    def term(self, i):
+        return self._key(self._term_table, self._term_blob, i).decode('utf-8')
+
+    def __contains__(self, word):
+        return self._find(self._term_table, self._term_blob, self.term_count,
+                          word.encode('utf-8')) >= 0
+
+    def postings(self, word):
+        """{doc id: 나온 횟수}. 없는 단어면 None."""
+        i = self._find(self._term_table, self._term_blob, self.term_count, word.encode('utf-8'))
+        if i < 0:
+            return None
+        return decode_postings(self._mm, self._term_postings_at(i))
+
+    def doc_frequency(self, word):
+        i = self._find(self._term_table, self._term_blob, self.term_count, word.encode('utf-8'))
+        return decode_varint(self._mm, self._term_postings_at(i))[0] if i >= 0 else 0
+
+    def _variant_words(self, variant):
+        i = self._find(self._variant_table, self._variant_blob, self.variant_count,
+                       variant.encode('utf-8'))
+        if i < 0:
+            return ()
+        _, data_off = PAIR.unpack_from(self._mm, self._variant_table + PAIR.size * i)
+        return [self.term(n) for n in decode_ids(self._mm, self._variant_lists + data_off)]
+
+    def correct(self, word):
+        """색인에 없는 단어 대신 찾을 가장 가까운 단어. 없으면 None."""
+        close = suggest(word, self._variant_words, self.max_distance, self.prefix_length)
+        return closest(close, self.doc_frequency)
+
+    def _doc_entry(self, doc_id):
+        """doc table 에서 doc_id 의 순번. 없으면 -1."""
+        lo, hi = 0, self.doc_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * mid)[0] < doc_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.doc_count:
+            found, _, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * lo)
+            if found == doc_id:
+                return lo
+        return -1
+
+    def doc_length(self, doc_id):
+        i = self._doc_entry(doc_id)
+        return DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * i)[2] if i >= 0 else 0
+
+    def document(self, doc_id):
+        i = self._doc_entry(doc_id)
+        if i < 0:
+            return None
+        _, start, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * i)
+        _, end, _ = DOC_ENTRY.unpack_from(self._mm, self._doc_table + DOC_ENTRY.size * (i + 1))
+        return self._mm[self._doc_blob + start:self._doc_blob + end].decode('utf-8')
+
+class SharedIndex:
+    """워커 프로세스가 쓰는 읽기 전용 색인. 파일이 새 스냅샷으로 바뀌면 다음 요청부터 새로 연다.
+
+    옛 mmap은 닫지 않고 참조가 없어질 때 정리되게 둔다 (다른 스레드가 아직 읽고 있을 수 있다).
+    """
+    read_only = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self._stat = self._file_key()
+        self._index = MappedSharedIndex(path)
+
+    def _file_key(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= SWAP_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked >= SWAP_CHECK_SECONDS:
+                    self._checked = now
+                    key = self._file_key()
+                    if key != self._stat:
+                        self._index = MappedSharedIndex(self.path)
+                        self._stat = key
+        return self._index
+
+    @property
+    def seq(self):
+        return self.current().seq
+
+    @property
+    def doc_count(self):
+        return self.current().doc_count
+
+    @contextmanager
+    def view(self):
+        """한 요청 동안 같은 스냅샷을 보도록 그 시점의 색인을 넘겨준다."""
+        yield self.current()
@@ -0,0 +1,37 @@
+# test_app2_ingest.py
+# POST /api/documents 가 공유 색인에 쓸 수 없는 문서 ID를 400으로 거절하는지 확인한다
+#
+#   python -m pytest test_app2_ingest.py
+import sys
+import importlib
+import pytest
+from inverted_store import InvertedStore, MAX_DOC_ID
+
+@pytest.fixture
+def app2(tmp_path, monkeypatch):
+    # app2 는 import 할 때 현재 폴더에 색인을 만들므로 임시 폴더에서 새로 import 한다
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('APP2_SHARED_INDEX', raising=False)
+    sys.modules.pop('app2', None)
+    module = importlib.import_module('app2')
+    yield module
+    module.store.close()
+    sys.modules.pop('app2', None)
+
+@pytest.mark.parametrize('doc_id', [-5, MAX_DOC_ID + 1])
+def test_out_of_range_id_is_rejected(app2, doc_id):
+    client = app2.app.test_client()
+    response = client.post('/api/documents', json={'documents': [{'id': doc_id, 'text': 'bad id'}]})
+    assert response.status_code == 400
+    response = client.post('/api/documents', json={'documents': [{'text': '정상 문서'}]})
+    assert response.status_code == 200
+
+    # 스냅샷 (공유 색인 포함) 을 쓰고 다시 열 수 있어야 한다
+    app2.store.snapshot()
+    app2.store.close()
+    reloaded = InvertedStore(app2.index_file)
+    try:
+        assert doc_id not in reloaded.documents
+        assert len(reloaded.documents) == len(app2.documents) + 1
+    finally:
+        reloaded.close()